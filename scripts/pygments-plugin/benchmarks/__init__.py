@@ -0,0 +1,124 @@
+"""
+    benchmarks
+    ~~~~~~~~~~
+
+    Performance benchmarks for the cilkhilite Pygments plugin.
+
+    Run from the plugin directory with ``python -m benchmarks``.  The
+    corpus in ``benchmarks/corpus`` covers each lexer shipped with the
+    plugin: Cilk/C++ code with ``/// Types:`` comments and hidden
+    regions, Java, Python, GAS and objdump output.
+    ``python -m benchmarks.coldstart`` measures the startup costs of the
+    plugin and the scripts instead.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import platform
+import sys
+import time
+
+import pygments
+
+# Prefer a monotonic high-resolution clock where one exists.
+timer = getattr(time, 'perf_counter', time.time)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+PLUGIN_DIR = os.path.dirname(BENCH_DIR)
+SCRIPTS_DIR = os.path.dirname(PLUGIN_DIR)
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def read_corpus_file(filename, repeat=1):
+    """Return the contents of corpus file <filename>, repeated <repeat>
+    times to produce larger inputs."""
+    with open(os.path.join(CORPUS_DIR, filename)) as f:
+        text = f.read()
+    return text * repeat
+
+
+def best_of(repeat, func, *args):
+    """Run <func> <repeat> times and return (best time, last result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = timer()
+        result = func(*args)
+        elapsed = timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def environment():
+    """Describe the interpreter and Pygments version being measured."""
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'pygments': pygments.__version__,
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+# Metrics compared against the baseline, and whether larger values are
+# better for each of them.  Other recorded values (raw timings, token
+# counts) are informational only.
+HIGHER_IS_BETTER = {
+    'bytes_per_sec': True,
+    'peak_kib': False,
+    'wall_seconds': False,
+    'import_seconds': False,
+    'first_token_seconds': False,
+}
+
+
+def _flatten(results, prefix=''):
+    for key, value in sorted(results.items()):
+        if isinstance(value, dict):
+            for item in _flatten(value, prefix + key + '/'):
+                yield item
+        else:
+            yield prefix + key, key, value
+
+
+def compare(baseline, results, threshold):
+    """Compare <results> against <baseline>.
+
+    Returns a list of (metric, baseline value, new value, relative
+    change) tuples for every metric that regressed by more than
+    <threshold> (a fraction, e.g. ``0.1`` for 10%)."""
+    old = dict((path, value) for path, key, value in
+               _flatten(baseline.get('benchmarks', {})))
+    regressions = []
+    for path, key, value in _flatten(results.get('benchmarks', {})):
+        if key not in HIGHER_IS_BETTER or not value:
+            continue
+        base = old.get(path)
+        if not base:
+            continue
+        if HIGHER_IS_BETTER[key]:
+            change = (base - value) / float(base)
+        else:
+            change = (value - base) / float(base)
+        if change > threshold:
+            regressions.append((path, base, value, change))
+    return regressions
@@ -0,0 +1,254 @@
+"""
+    benchmarks.coldstart
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Startup costs of the cilkhilite plugin and scripts.  A build runs
+    pygmentize, ``pyginline`` and ``pyginpar`` as many short processes,
+    so the time before the first output matters as much as the
+    throughput measured by `benchmarks.throughput`.
+
+    Every measurement runs in a fresh interpreter:
+
+    - the import time of each ``cilkhilite`` module, including the
+      Pygments modules it imports;
+    - the time to the first token of each lexer of the plugin, from
+      looking it up through the ``pygments.lexers`` entry points to the
+      first token of a short corpus excerpt.  This includes loading the
+      plugin and compiling the lexer's regular expressions.  The entry
+      points are used, rather than `pygments.lexers.get_lexer_by_name`,
+      because the builtin Pygments lexer of the same name shadows
+      ``objdump``;
+    - the wall-clock time of an empty interpreter, and of ``pyginline``
+      and ``pyginpar`` on inputs of a single snippet.
+
+    The results are compared against ``benchmarks/coldstart.json``, as
+    with ``python -m benchmarks``.  Run from the plugin directory with
+    ``python -m benchmarks.coldstart``.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import pkgutil
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import BENCH_DIR, PLUGIN_DIR, SCRIPTS_DIR, best_of, compare, \
+    environment, load_results, read_corpus_file, save_results, timer
+
+
+PROG = 'python -m benchmarks.coldstart'
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'coldstart.json')
+
+# Lexer alias and the corpus file whose first lines it lexes.
+LEXERS = [
+    ('cilk', 'fib.c'),
+    ('gascb', 'fib.s'),
+    ('javacb', 'Matrix.java'),
+    ('pythoncb', 'transpose.py'),
+    ('objdump', 'fib.cilk-objdump'),
+    ('cilk-objdump', 'fib.cilk-objdump'),
+]
+
+EXCERPT_LINES = 20
+
+# Each child prints the seconds it measured.
+IMPORT_CODE = '''
+import importlib, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(time.perf_counter() - start)
+'''
+
+FIRST_TOKEN_CODE = '''
+import sys, time
+start = time.perf_counter()
+from pygments.plugin import find_plugin_lexers
+for lexer_cls in find_plugin_lexers():
+    if sys.argv[1] in lexer_cls.aliases:
+        break
+else:
+    sys.exit('no plugin lexer for ' + sys.argv[1])
+next(iter(lexer_cls().get_tokens(sys.stdin.read())))
+print(time.perf_counter() - start)
+'''
+
+
+def child_env():
+    """Return the environment of the measured processes: cilkhilite is
+    imported from this tree, without profiling or tracing."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [PLUGIN_DIR] + [p for p in [env.get('PYTHONPATH')] if p])
+    for var in ('CILKHILITE_PROFILE', 'CILKHILITE_TRACE'):
+        env.pop(var, None)
+    return env
+
+
+def measure(repeat, cmd, stdin=None):
+    """Run <cmd> <repeat> times and return the smallest number of seconds
+    it printed, or None if it failed."""
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(cmd, input=stdin, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, env=child_env(),
+                              universal_newlines=True)
+        if proc.returncode != 0:
+            print('{0}: {1} failed:\n{2}'.format(
+                PROG, ' '.join(cmd[3:]), proc.stderr.strip()), file=sys.stderr)
+            return None
+        seconds = float(proc.stdout)
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def modules():
+    """Return the names of the cilkhilite modules."""
+    package = os.path.join(PLUGIN_DIR, 'cilkhilite')
+    return ['cilkhilite'] + sorted(
+        'cilkhilite.' + name for _, name, _ in pkgutil.iter_modules([package])
+        if name != '__main__')
+
+
+def bench_imports(repeat):
+    results = {}
+    for module in modules():
+        seconds = measure(repeat, [sys.executable, '-c', IMPORT_CODE, module])
+        if seconds is not None:
+            results[module] = {'import_seconds': seconds}
+    return results
+
+
+def bench_first_token(repeat):
+    results = {}
+    for alias, filename in LEXERS:
+        excerpt = ''.join(read_corpus_file(filename).splitlines(True)
+                          [:EXCERPT_LINES])
+        seconds = measure(repeat, [sys.executable, '-c', FIRST_TOKEN_CODE,
+                                   alias], excerpt)
+        if seconds is not None:
+            results[alias] = {'first_token_seconds': seconds}
+    return results
+
+
+def write_tiny_inputs(workdir):
+    """Write a .vrb and an .ipvrb file of one snippet each, and return
+    their paths."""
+    vrb = os.path.join(workdir, 'tiny-inlinecode.vrb')
+    ipvrb = os.path.join(workdir, 'tiny-ipcode.ipvrb')
+    with open(vrb, 'w') as f:
+        f.write('\\codehilite@newinlinecode{@codehilite@code@cilk@tiny}'
+                '{cilk_spawn fib(n-1);}{cilk}{}\n')
+    with open(ipvrb, 'w') as f:
+        f.write('@codehilite@InParCode@a[ -l cilk '
+                '-P verbenvironment=SaveVerbatim -P reindent '
+                '-P texcomments]\n')
+        f.write('x = cilk_spawn fib(n-1);\n')
+    return vrb, ipvrb
+
+
+def bench_processes(repeat):
+    """Measure the wall-clock time of an empty interpreter and of the
+    pyginline and pyginpar scripts on tiny inputs."""
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='cilkhilite-coldstart-')
+    try:
+        vrb, ipvrb = write_tiny_inputs(workdir)
+        commands = [
+            ('python', [sys.executable, '-c', 'pass']),
+            ('pyginline', [sys.executable, os.path.join(SCRIPTS_DIR, 'pyginline'),
+                           vrb, os.path.join(workdir, 'pyginline.sty')]),
+            ('pyginpar', [sys.executable, os.path.join(SCRIPTS_DIR, 'pyginpar'),
+                          ipvrb, os.path.join(workdir, 'pyginpar.sty'),
+                          '--no-cache']),
+        ]
+        env = child_env()
+        for name, cmd in commands:
+
+            def run():
+                return subprocess.call(cmd, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, env=env)
+
+            if run() != 0:
+                print('{0}: {1} failed'.format(PROG, name), file=sys.stderr)
+                continue
+            seconds, _ = best_of(repeat, run)
+            results[name] = {'wall_seconds': seconds}
+    finally:
+        shutil.rmtree(workdir)
+    return results
+
+
+def report(results):
+    benchmarks = results['benchmarks']
+    rows = [('import ' + module, m['import_seconds'])
+            for module, m in sorted(benchmarks['imports'].items())]
+    rows += [('first token ' + alias, m['first_token_seconds'])
+             for alias, m in sorted(benchmarks['first_token'].items())]
+    rows += [('run ' + name, m['wall_seconds'])
+             for name, m in sorted(benchmarks['processes'].items())]
+    print('{0:<36} {1:>10}'.format('measurement', 'ms'))
+    for name, seconds in rows:
+        print('{0:<36} {1:>10.2f}'.format(name, seconds * 1000))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog=PROG,
+        description='Benchmark the startup of the cilkhilite plugin and '
+        'scripts, each measurement in a fresh interpreter.')
+    parser.add_argument('--repeat', '-r', type=int, default=10,
+                        help='number of runs; the fastest is reported (default: 10)')
+    parser.add_argument('--baseline', '-b', default=DEFAULT_BASELINE,
+                        help='baseline JSON file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--threshold', '-t', type=float, default=0.20,
+                        help='fail if any metric regresses by more than this '
+                        'fraction of its baseline value (default: 0.20, as '
+                        'startup times are noisier than throughput)')
+    parser.add_argument('--output', '-o',
+                        help='also write the results to this JSON file')
+    args = parser.parse_args(args)
+
+    start = timer()
+    results = {
+        'environment': environment(),
+        'benchmarks': {
+            'imports': bench_imports(args.repeat),
+            'first_token': bench_first_token(args.repeat),
+            'processes': bench_processes(args.repeat),
+        },
+    }
+    report(results)
+    print('{0}: finished in {1:.1f}s'.format(PROG, timer() - start))
+
+    if args.output:
+        save_results(results, args.output)
+    if args.save:
+        save_results(results, args.baseline)
+        print('{0}: saved baseline to {1}'.format(PROG, args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('{0}: no baseline at {1}; run with --save to create one'.format(
+            PROG, args.baseline))
+        return 0
+
+    regressions = compare(load_results(args.baseline), results, args.threshold)
+    for path, old, new, change in regressions:
+        print('{0}: regression in {1}: {2:.6g} -> {3:.6g} ({4:+.1%})'.format(
+            PROG, path, old, new, change), file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+    benchmarks.concurrency
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Stress check for sharing the cilkhilite lexers and formatters between
+    threads.  The same jobs are highlighted serially and with
+    `cilkhilite.highlight.highlight_many`, using one shared instance of
+    each lexer and formatter, and the outputs are compared.
+
+    Each Cilk job declares its own type with a ``/// Types:`` comment and
+    uses the types declared by the others, so names leaking between
+    concurrent lexing calls show up as differences.
+
+    Run from the plugin directory with ``python -m benchmarks.concurrency``.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+from cilkhilite.highlight import highlight_many
+
+from benchmarks import read_corpus_file, timer
+from benchmarks.throughput import CORPUS, FORMATTERS
+
+
+PROG = 'python -m benchmarks.concurrency'
+
+NAMES = 8
+
+
+def cilk_variant(text, i):
+    """Return <text> with a type declaration that is unique to job <i>
+    and uses of the types of the other jobs."""
+    # Only names declared as types are highlighted as such in sizeof()
+    # and before ::.  The markers keep the uses visible in sources that
+    # are hidden by default.
+    uses = ''.join('int use%d = sizeof(stress%d_type) + stress%d_type::x;\n'
+                   % (j, j, j) for j in range(NAMES))
+    return '/// Types: stress%d_type\n%s///<<\n%s///>>\n' % (
+        i % NAMES, text, uses)
+
+
+def make_jobs(copies):
+    """Return a list of (name, code, lexer, formatter) jobs.  Jobs using
+    the same lexer class, or the same formatter with the same hiding,
+    share one instance."""
+    lexers = {}
+    formatters = {}
+    jobs = []
+    for i in range(copies):
+        for name, filename, lexer_cls, scale, hidden in CORPUS:
+            lexer = lexers.get(lexer_cls)
+            if lexer is None:
+                lexer = lexers[lexer_cls] = lexer_cls()
+            text = read_corpus_file(filename, scale)
+            if filename.endswith(('.c', '.cpp')):
+                text = cilk_variant(text, i)
+            for fmt_name, fmt_cls, fmt_opts in FORMATTERS:
+                key = (fmt_name, hidden)
+                formatter = formatters.get(key)
+                if formatter is None:
+                    formatter = formatters[key] = fmt_cls(hidebydefault=hidden,
+                                                          **fmt_opts)
+                jobs.append(('%s/%s/%d' % (name, fmt_name, i),
+                             text, lexer, formatter))
+    return jobs
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog=PROG,
+        description='Compare serial and concurrent highlighting output.')
+    parser.add_argument('--threads', '-j', type=int, default=8,
+                        help='number of threads (default: 8)')
+    parser.add_argument('--copies', '-n', type=int, default=4,
+                        help='number of copies of each job (default: 4)')
+    args = parser.parse_args(args)
+
+    # Switch threads often to make interleavings likely.
+    if hasattr(sys, 'setswitchinterval'):
+        sys.setswitchinterval(1e-6)
+
+    jobs = make_jobs(args.copies)
+    triples = [job[1:] for job in jobs]
+
+    start = timer()
+    serial = highlight_many(triples, processes=1)
+    serial_time = timer() - start
+    start = timer()
+    concurrent = highlight_many(triples, processes=args.threads)
+    concurrent_time = timer() - start
+
+    mismatches = [job[0] for job, a, b in zip(jobs, serial, concurrent)
+                  if a != b]
+    print('{0} jobs: serial {1:.2f}s, {2} threads {3:.2f}s'.format(
+        len(jobs), serial_time, args.threads, concurrent_time))
+    for name in mismatches:
+        print('{0}: output differs for {1}'.format(PROG, name),
+              file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import java.util.Arrays;
+
+/** A dense row-major matrix used in the Java examples. */
+public class Matrix {
+    private final int rows;
+    private final int cols;
+    private final double[] data;
+
+    public Matrix(int rows, int cols) {
+        this.rows = rows;
+        this.cols = cols;
+        this.data = new double[rows * cols];
+    }
+
+    public double get(int i, int j) {
+        return data[i * cols + j];  /// \label{li:java-get}
+    }
+
+    public void set(int i, int j, double v) {
+        data[i * cols + j] = v;
+    }
+
+    public Matrix multiply(Matrix other) {
+        Matrix result = new Matrix(rows, other.cols);
+        for (int i = 0; i < rows; ++i) {
+            for (int k = 0; k < cols; ++k) {
+                double a = get(i, k);
+                for (int j = 0; j < other.cols; ++j) {
+                    result.data[i * other.cols + j] += a * other.get(k, j);
+                }
+            }
+        }
+        return result;
+    }
+
+    @Override
+    public String toString() {
+        return "Matrix(" + rows + "x" + cols + ", " + Arrays.toString(data) + ")";
+    }
+}
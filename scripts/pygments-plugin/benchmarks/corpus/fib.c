@@ -0,0 +1,26 @@
+/// Types: fib_t
+#include <stdio.h>
+#include <stdlib.h>
+#include <cilk/cilk.h>
+
+typedef long fib_t;
+
+fib_t fib(int n) {
+  if (n < 2) return n;  /// \label{li:fib-base}
+  fib_t x, y;
+  x = cilk_spawn fib(n - 1);  /// \label{li:fib-spawn}
+  y = fib(n - 2);
+  cilk_sync;  /// \label{li:fib-sync}
+  return x + y;
+}
+
+/* Driver.  The result is printed so that the computation is not
+ * optimized away. */
+int main(int argc, char *argv[]) {
+  int n = 30;
+  if (argc > 1)
+    n = atoi(argv[1]);
+  fib_t result = fib(n);
+  printf("fib(%d) = %ld\n", n, result);
+  return 0;
+}
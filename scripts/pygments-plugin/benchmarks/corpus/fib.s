@@ -0,0 +1,36 @@
+	.text
+	.file	"fib.c"
+	.globl	fib
+	.p2align	4, 0x90
+	.type	fib,@function
+fib:
+	.cfi_startproc
+##<<
+	pushq	%rbp
+	movq	%rsp, %rbp
+	pushq	%r14
+	pushq	%rbx
+	movl	%edi, %ebx
+	cmpl	$2, %edi
+	jl	.LBB0_2
+	leal	-1(%rbx), %edi
+	callq	fib          ## \label{li:asm-call}
+	movq	%rax, %r14
+	addl	$-2, %ebx
+	movl	%ebx, %edi
+	callq	fib
+	addq	%r14, %rax
+	popq	%rbx
+	popq	%r14
+	popq	%rbp
+	retq
+##>>
+.LBB0_2:
+	movslq	%ebx, %rax
+	popq	%rbx
+	popq	%r14
+	popq	%rbp
+	retq
+.Lfunc_end0:
+	.size	fib, .Lfunc_end0-fib
+	.cfi_endproc
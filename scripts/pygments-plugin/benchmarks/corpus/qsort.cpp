@@ -0,0 +1,59 @@
+/// Types: Item item_iter
+#include <algorithm>
+#include <cilk/cilk.h>
+#include <functional>
+#include <vector>
+
+///>>
+// Helper routines that are not shown in the book figure.
+static inline int median3(int a, int b, int c) {
+  if (a < b) {
+    if (b < c) return b;
+    return (a < c) ? c : a;
+  }
+  if (a < c) return a;
+  return (b < c) ? c : b;
+}
+
+typedef std::vector<int>::iterator item_iter;
+///<<
+template <typename Iter, typename Cmp>
+void sample_qsort(Iter begin, Iter end, Cmp comp) {
+  if (end - begin < 2)  /// \label{li:qsort-base}
+    return;
+  --end;
+  Iter middle = std::partition(begin, end,
+                               std::bind2nd(comp, *end));
+  using std::swap;
+  swap(*end, *middle);
+  cilk_spawn sample_qsort(++middle, ++end, comp);  /// \label{li:qsort-spawn}
+  sample_qsort(begin, --middle, comp);
+  cilk_sync;
+}
+///>>
+
+struct Item {
+  int key;
+  double weight;
+  Item *next;
+};
+
+class Sorter {
+ public:
+  explicit Sorter(std::size_t n) : data_(n) {}
+  void run() {
+    cilk_for (std::size_t i = 0; i < data_.size(); ++i)
+      data_[i] = static_cast<int>((i * 7919) % 1009);
+    sample_qsort(data_.begin(), data_.end(), std::less<int>());
+  }
+ private:
+  std::vector<int> data_;
+};
+
+int main(int argc, char *argv[]) {
+  std::size_t n = (argc > 1) ? std::atoi(argv[1]) : 1000000;
+  Sorter s(n);
+  s.run();
+  return 0;
+}
+///<<
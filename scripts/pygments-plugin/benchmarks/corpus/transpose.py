@@ -0,0 +1,32 @@
+import sys
+
+
+def transpose(a):
+    """Return the transpose of the square matrix a."""
+    n = len(a)
+    b = [[0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(n):
+            b[j][i] = a[i][j]  ## \label{li:py-transpose}
+    return b
+
+
+class Timer(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        import time
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        import time
+        sys.stderr.write('%s: %.3fs\n' % (self.name, time.time() - self.start))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    a = [[i * n + j for j in range(n)] for i in range(n)]
+    with Timer('transpose'):
+        transpose(a)
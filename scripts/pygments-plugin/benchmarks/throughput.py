@@ -0,0 +1,249 @@
+"""
+    benchmarks.throughput
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Lexing and formatting throughput of the cilkhilite lexers and
+    formatters, plus end-to-end timings of the ``pyginline`` and
+    ``pyginpar`` scripts.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import argparse
+import functools
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from cilkhilite.cilklexer import CilkFastLexer, CilkLexer, CilkObjdumpLexer, GasCBLexer, \
+    JavaCBLexer, PythonCBLexer
+from cilkhilite.cilkformatter import CilkBookFormatter
+from cilkhilite.chrtfformatter import CHRtfFormatter
+from cilkhilite.cilkstyle import CilkBookStyle
+
+from benchmarks import SCRIPTS_DIR, DEFAULT_BASELINE, best_of, compare, \
+    environment, load_results, read_corpus_file, save_results, timer
+
+
+PROG = 'benchmarks'
+
+# Each corpus entry is (benchmark name, corpus file, lexer class or
+# factory, number of times the file is repeated, whether the file uses
+# hidden regions).
+CORPUS = [
+    ('cilk-fib', 'fib.c', CilkLexer, 1, False),
+    ('cilk-qsort', 'qsort.cpp', CilkLexer, 1, True),
+    ('cilk-large', 'qsort.cpp', CilkLexer, 25, True),
+    ('cilk-large-skiphidden', 'qsort.cpp',
+     functools.partial(CilkLexer, skiphidden=True, hidebydefault=True), 25, True),
+    ('cilkfast-large', 'qsort.cpp', CilkFastLexer, 25, True),
+    ('java', 'Matrix.java', JavaCBLexer, 1, False),
+    ('python', 'transpose.py', PythonCBLexer, 1, False),
+    ('gas', 'fib.s', GasCBLexer, 1, True),
+    ('cilk-objdump', 'fib.cilk-objdump', CilkObjdumpLexer, 100, False),
+]
+
+# Formatters and the options latexmkrc passes to them.
+FORMATTERS = [
+    ('cilkbook', CilkBookFormatter,
+     dict(texcomments=True, reindent=True,
+          verbenvironment='CodeFigVerbatim', style=CilkBookStyle)),
+    ('cilkbook-macros', CilkBookFormatter,
+     dict(texcomments=True, reindent=True, stylemacros=True,
+          verbenvironment='CodeFigVerbatim', style=CilkBookStyle)),
+    ('chrtf', CHRtfFormatter,
+     dict(reindent=True, style=CilkBookStyle)),
+]
+
+
+def lex(lexer, text):
+    return list(lexer.get_tokens(text))
+
+
+def format_tokens(formatter, tokens):
+    outfile = StringIO()
+    formatter.format(tokens, outfile)
+    return outfile.getvalue()
+
+
+def peak_memory(func, *args):
+    """Return the peak memory, in KiB, allocated while running <func>."""
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_corpus(repeat):
+    """Measure each lexer and lexer/formatter pair on the corpus."""
+    results = {}
+    for name, filename, lexer_cls, scale, hidden in CORPUS:
+        text = read_corpus_file(filename, scale)
+        nbytes = len(text.encode('utf-8'))
+        lexer = lexer_cls()
+
+        seconds, tokens = best_of(repeat, lex, lexer, text)
+        entry = {'lex': {
+            'seconds': seconds,
+            'tokens': len(tokens),
+            'bytes_per_sec': nbytes / seconds,
+            'tokens_per_sec': len(tokens) / seconds,
+            'peak_kib': peak_memory(lex, lexer, text),
+        }}
+
+        for fmt_name, fmt_cls, fmt_opts in FORMATTERS:
+            formatter = fmt_cls(hidebydefault=hidden, **fmt_opts)
+            seconds, output = best_of(repeat, format_tokens, formatter, tokens)
+            entry[fmt_name] = {
+                'seconds': seconds,
+                'output_bytes': len(output.encode('utf-8')),
+                'bytes_per_sec': nbytes / seconds,
+                'tokens_per_sec': len(tokens) / seconds,
+                'peak_kib': peak_memory(format_tokens, formatter, tokens),
+            }
+        results[name] = entry
+    return results
+
+
+def _csname(i):
+    """Return a name made only of letters."""
+    name = ''
+    while True:
+        name = chr(ord('a') + i % 26) + name
+        i //= 26
+        if i == 0:
+            return name
+
+
+def write_script_inputs(workdir):
+    """Write a .vrb and an .ipvrb file exercising pyginline and
+    pyginpar, and return their paths."""
+    vrb = os.path.join(workdir, 'bench-inlinecode.vrb')
+    ipvrb = os.path.join(workdir, 'bench-ipcode.ipvrb')
+    code = read_corpus_file('fib.c')
+    with open(vrb, 'w') as f:
+        lines = [line.strip() for line in code.splitlines() if line.strip()]
+        for i, line in enumerate(lines * 10):
+            # Make each line unique, or pyginline skips the repeats.
+            line = '%s /* %d */' % (line, i)
+            digest = hashlib.md5(line.encode('utf-8')).hexdigest()
+            f.write('\\codehilite@newinlinecode{@codehilite@code@cilk@%s}{%s}{cilk}\n'
+                    % (digest, line))
+    with open(ipvrb, 'w') as f:
+        for i in range(20):
+            f.write('@codehilite@InParCode@%s[ -l cilk '
+                    '-P verbenvironment=SaveVerbatim -P reindent '
+                    '-P texcomments]\n' % _csname(i))
+            f.write(code)
+    return vrb, ipvrb
+
+
+def bench_scripts(repeat):
+    """Measure the wall-clock time of the pyginline and pyginpar scripts,
+    including interpreter startup."""
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='cilkhilite-bench-')
+    try:
+        vrb, ipvrb = write_script_inputs(workdir)
+        for script, infile in (('pyginline', vrb), ('pyginpar', ipvrb)):
+            cmd = [sys.executable, os.path.join(SCRIPTS_DIR, script),
+                   infile, os.path.join(workdir, script + '.sty')]
+            if script == 'pyginpar':
+                # Time the highlighting, not cache hits.
+                cmd.append('--no-cache')
+
+            def run():
+                return subprocess.call(cmd, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+
+            if run() != 0:
+                print('{0}: {1} failed; is the plugin installed?'.format(
+                    PROG, script), file=sys.stderr)
+                continue
+            seconds, _ = best_of(repeat, run)
+            results[script] = {'wall_seconds': seconds}
+    finally:
+        shutil.rmtree(workdir)
+    return results
+
+
+def report(results):
+    print('{0:<22} {1:<15} {2:>10} {3:>12} {4:>12} {5:>10}'.format(
+        'corpus', 'phase', 'ms', 'tokens/s', 'KiB/s', 'peak KiB'))
+    for name, entry in sorted(results['benchmarks']['corpus'].items()):
+        for phase in ['lex'] + [fmt[0] for fmt in FORMATTERS]:
+            m = entry[phase]
+            print('{0:<22} {1:<15} {2:>10.2f} {3:>12.0f} {4:>12.1f} {5:>10}'.format(
+                name, phase, m['seconds'] * 1000, m['tokens_per_sec'],
+                m['bytes_per_sec'] / 1024, m['peak_kib']))
+    for script, m in sorted(results['benchmarks']['scripts'].items()):
+        print('{0:<24} {1:>10.2f}'.format(script, m['wall_seconds'] * 1000))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m ' + PROG,
+        description='Benchmark the cilkhilite lexers, formatters and scripts.')
+    parser.add_argument('--repeat', '-r', type=int, default=5,
+                        help='number of runs; the fastest is reported (default: 5)')
+    parser.add_argument('--baseline', '-b', default=DEFAULT_BASELINE,
+                        help='baseline JSON file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--threshold', '-t', type=float, default=0.10,
+                        help='fail if any metric regresses by more than this '
+                        'fraction of its baseline value (default: 0.10)')
+    parser.add_argument('--output', '-o',
+                        help='also write the results to this JSON file')
+    parser.add_argument('--no-scripts', action='store_true',
+                        help='skip the end-to-end pyginline/pyginpar timings')
+    args = parser.parse_args(args)
+
+    start = timer()
+    results = {
+        'environment': environment(),
+        'benchmarks': {
+            'corpus': bench_corpus(args.repeat),
+            'scripts': {} if args.no_scripts else bench_scripts(args.repeat),
+        },
+    }
+    report(results)
+    print('{0}: finished in {1:.1f}s'.format(PROG, timer() - start))
+
+    if args.output:
+        save_results(results, args.output)
+    if args.save:
+        save_results(results, args.baseline)
+        print('{0}: saved baseline to {1}'.format(PROG, args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('{0}: no baseline at {1}; run with --save to create one'.format(
+            PROG, args.baseline))
+        return 0
+
+    regressions = compare(load_results(args.baseline), results, args.threshold)
+    for path, old, new, change in regressions:
+        print('{0}: regression in {1}: {2:.6g} -> {3:.6g} ({4:+.1%})'.format(
+            PROG, path, old, new, change), file=sys.stderr)
+    return 1 if regressions else 0
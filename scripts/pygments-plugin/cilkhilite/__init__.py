@@ -0,0 +1,6 @@
+# Version of the highlighted output, part of the keys of the .ipcache of
+# pyginpar.  Bump it whenever the output of the cilkhilite lexers or
+# formatters changes, along with \codehilite@formatversion in
+# codehilite.sty, so that blocks highlighted by an older version are
+# highlighted again.
+FORMAT_VERSION = 'cilkhilite-3'
@@ -0,0 +1,5 @@
+import sys
+
+from cilkhilite.cmdline import main
+
+sys.exit(main())
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.budget
+    ~~~~~~~~~~~~~~~~~
+
+    A time budget for highlighting each snippet, used by the
+    ``--timeout`` option of ``pyginline`` and ``pyginpar``.
+
+    A `Budget` highlights snippets in a worker process.  If a snippet is
+    not highlighted within the budget, e.g. because some input makes a
+    lexer's regular expressions backtrack, the worker is killed, a new
+    one is started for the next snippet, and the snippet is formatted as
+    plain text with the same formatter instead, so that it still appears
+    in the document, escaped, in the same verbatim environment.  A
+    warning names the snippet, so that its source can be fixed.
+
+    The worker is started on the first snippet, by forking where the
+    platform supports it.  Before that, each lexer and formatter is
+    looked up and instantiated in the parent, which imports their
+    modules and compiles the lexer's regular expressions once, so that
+    a worker forked to replace a killed one does not spend the budget of
+    its first snippet doing it again.
+
+    While a `cilkhilite.profiling` profiler or a `cilkhilite.trace`
+    tracer is active, the snippets are highlighted in the process
+    itself, without a budget, so that the profile or the trace covers
+    their lexing and formatting rather than the wait for a worker.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import multiprocessing
+import sys
+import time
+from io import BytesIO, StringIO
+
+from pygments import highlight
+from pygments.formatters import get_formatter_by_name
+from pygments.lexers import get_lexer_by_name
+from pygments.lexers.special import TextLexer
+
+from cilkhilite import profiling, trace
+
+__all__ = ['BudgetExceeded', 'Budget', 'plain']
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def _highlight(code, lexer_name, lexer_opts, filters, formatter_name,
+               formatter_opts):
+    start = time.perf_counter()
+    lexer = get_lexer_by_name(lexer_name, **lexer_opts)
+    for filter_name in filters:
+        lexer.add_filter(filter_name)
+    formatter = get_formatter_by_name(formatter_name, **formatter_opts)
+    setup = time.perf_counter()
+    with trace.span('lex', 'phase'):
+        tokens = list(lexer.get_tokens(code))
+    lexed = time.perf_counter()
+    outfile = BytesIO() if getattr(formatter, 'encoding', None) else StringIO()
+    with trace.span('format', 'phase'):
+        formatter.format(tokens, outfile)
+    formatted = time.perf_counter()
+    return (outfile.getvalue(), setup - start, lexed - setup,
+            formatted - lexed)
+
+
+def _serve(conn):
+    """Highlight the jobs received on <conn> until it is closed."""
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            conn.send((True, _highlight(*job)))
+        except Exception as err:
+            try:
+                conn.send((False, err))
+            except Exception:
+                # The exception cannot be pickled.
+                conn.send((False, RuntimeError(repr(err))))
+
+
+def _size(output):
+    return len(output if isinstance(output, bytes) else output.encode('utf-8'))
+
+
+def _context():
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def plain(code, formatter_name, formatter_opts):
+    """Return <code> formatted as plain text by the formatter
+    <formatter_name> with <formatter_opts>."""
+    formatter = get_formatter_by_name(formatter_name, **formatter_opts)
+    return highlight(code, TextLexer(), formatter)
+
+
+class Budget(object):
+    """Highlights snippets in a worker process, allowing <seconds> for
+    each snippet."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._process = None
+        self._conn = None
+        self._loaded = set()
+
+    def _load(self, lexer_name, lexer_opts, formatter_name, formatter_opts):
+        # Instantiate the lexer and formatter in this process, so that
+        # the workers forked from it inherit their modules and compiled
+        # regular expressions.
+        key = (lexer_name, formatter_name)
+        if key not in self._loaded:
+            get_lexer_by_name(lexer_name, **lexer_opts)
+            get_formatter_by_name(formatter_name, **formatter_opts)
+            self._loaded.add(key)
+
+    def _start(self):
+        context = _context()
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child,),
+                                        daemon=True)
+        self._process.start()
+        child.close()
+
+    def _kill(self):
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process = self._conn = None
+
+    def run(self, code, lexer_name, formatter_name, lexer_opts=None,
+            formatter_opts=None, filters=()):
+        """Highlight <code> in the worker with the lexer <lexer_name>,
+        modified by <lexer_opts> and <filters>, and the formatter
+        <formatter_name>, modified by <formatter_opts>.  Return the
+        output with the seconds spent creating the lexer and formatter,
+        lexing and formatting.  Raise BudgetExceeded if the worker takes
+        longer than the budget, and reraise the exceptions raised in the
+        worker.  While profiling or tracing, <code> is highlighted in
+        this process instead, without a budget."""
+        job = (code, lexer_name, lexer_opts or {}, list(filters),
+               formatter_name, formatter_opts or {})
+        if profiling.active() is not None or trace.active() is not None:
+            with profiling.scope():
+                return _highlight(*job)
+        self._load(lexer_name, job[2], formatter_name, job[5])
+        if self._process is None:
+            self._start()
+        self._conn.send(job)
+        if not self._conn.poll(self.seconds):
+            self._kill()
+            raise BudgetExceeded(self.seconds)
+        try:
+            ok, result = self._conn.recv()
+        except EOFError:
+            self._kill()
+            raise RuntimeError('highlighting worker exited')
+        if not ok:
+            raise result
+        return result
+
+    def highlight(self, code, lexer_name, formatter_name, lexer_opts=None,
+                  formatter_opts=None, filters=(), stats=None, name=None):
+        """Return (output, highlighted), where output is <code>
+        highlighted as by `run`.  If this exceeds the budget, warn about
+        the snippet <name>, and output is <code> formatted as plain text
+        instead, with highlighted false.  The snippet is recorded in
+        <stats>, if given, and the snippets over budget are counted as
+        ``timeouts``."""
+        try:
+            output, setup, lex, fmt = self.run(code, lexer_name,
+                                               formatter_name, lexer_opts,
+                                               formatter_opts, filters)
+        except BudgetExceeded:
+            print("\n{0}: Warning: highlighting \"{1}\" with lexer \"{2}\" "
+                  "took over {3:g} s; using plain verbatim text".format(
+                      sys.argv[0], name, lexer_name, self.seconds),
+                  file=sys.stderr)
+            output = plain(code, formatter_name, formatter_opts or {})
+            if stats is not None:
+                stats.count('timeouts')
+                stats.add_time('timeout', self.seconds)
+                stats.snippet(name, lexer_name, len(code.encode('utf-8')),
+                              _size(output))
+            return output, False
+        if stats is not None:
+            stats.add_time('setup', setup)
+            stats.snippet(name, lexer_name, len(code.encode('utf-8')),
+                          _size(output), lex, fmt)
+        return output, True
+
+    def close(self):
+        """Stop the worker."""
+        if self._process is not None:
+            self._conn.send(None)
+            self._process.join()
+            self._conn.close()
+            self._process = self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -15,13 +15,21 @@
 """
 
 import re
+from itertools import chain
 
 from pygments.formatter import Formatter
 from pygments.token import Token, STANDARD_TYPES
 from pygments.util import get_bool_opt
 
+from cilkhilite.hidden import get_hide_opt, resolve_hidebydefault
+from cilkhilite.profiling import profiled
+from cilkhilite.trace import traced
+
 __all__ = ['CHRtfFormatter']
 
+# Sentinel token ending the token stream in the formatting loop.
+_END_OF_TOKENS = ((object(), ''),)
+
 
 class CHRtfFormatter(Formatter):
     """
@@ -59,6 +67,8 @@ class CHRtfFormatter(Formatter):
         pygmentized output.  The ``'/** END HIDDEN **/'`` and
         ``'/** BEGIN HIDDEN **/'`` lines will also render the intervening
         lines of code visible in the pygmentized output (default: ``False``).
+        If set to ``'auto'``, code is hidden by default exactly when the
+        token stream contains such a marker.
 
     `reindent`
         If set to ``True``, reindents the visible pygmentized code such that
@@ -85,7 +95,7 @@ class CHRtfFormatter(Formatter):
         Formatter.__init__(self, **options)
         self.fontface = options.get('fontface') or ''
         # New options added with cilkhilite pygments plugin
-        self.hidebydefault = get_bool_opt(options, 'hidebydefault', False)
+        self.hidebydefault = get_hide_opt(options, 'hidebydefault', False)
         self.reindent = get_bool_opt(options, 'reindent', False)
 
     def _escape(self, text):
@@ -119,6 +129,29 @@ class CHRtfFormatter(Formatter):
 
         return ''.join(buf).replace('\n', '\\par\n')
 
+    def _get_start(self, ttype, color_mapping):
+        """Return the RTF commands that start text of type <ttype>."""
+        while not self.style.styles_token(ttype) and ttype.parent is not None:
+            ttype = ttype.parent
+        style = self.style.style_for_token(ttype)
+        buf = []
+        if style['bgcolor']:
+            buf.append(r'\cb%d' % color_mapping[style['bgcolor']])
+        if style['color']:
+            buf.append(r'\cf%d' % color_mapping[style['color']])
+        if style['bold']:
+            buf.append(r'\b')
+        if style['italic']:
+            buf.append(r'\i')
+        if style['underline']:
+            buf.append(r'\ul')
+        if style['border']:
+            buf.append(r'\chbrdr\chcfpat%d' %
+                       color_mapping[style['border']])
+        return ''.join(buf)
+
+    @traced('formatter')
+    @profiled
     def format_unencoded(self, tokensource, outfile):
         # rtf 1.8 header
         outfile.write(r'{\rtf1\ansi\deff0'
@@ -144,14 +177,36 @@ class CHRtfFormatter(Formatter):
 
         # highlight stream
         # TB 09/09/2012: Added functionality to skip invisible comments.
-        skiptoken = self.hidebydefault
+        skiptoken, tokensource = resolve_hidebydefault(self.hidebydefault,
+                                                       tokensource)
         initialindent = ''
         reindent = self.reindent
         find_next_indent = self.reindent
         newline = False
-
-        for ttype, value in tokensource:
+        # The style commands of each token type, and those of the open
+        # group of styled text.
+        starts = {}
+        group = ''
+        # Adjacent tokens of the same type are merged into one run, as
+        # in CilkBookFormatter.
+        runtype = None
+        runvalue = ''
+
+        for ttype, value in chain(tokensource, _END_OF_TOKENS):
             # TB 09/09/2012: Ellide invisible comment blocks
+            # Current Pygments lexes whitespace as Text.Whitespace.  Format
+            # it as plain text, as older versions did, so that it is
+            # not wrapped in style commands and can be reindented.
+            if ttype in Token.Text.Whitespace:
+                ttype = Token.Text
+            if ttype is runtype:
+                runvalue += value
+                continue
+            ttype, runtype = runtype, ttype
+            value, runvalue = runvalue, value
+            if ttype is None:
+                continue
+
             if ttype in Token.Comment.Invisible.End:
                 skiptoken = False
                 #find_next_indent = self.reindent
@@ -206,26 +261,17 @@ class CHRtfFormatter(Formatter):
                 value = ''.join(newlines)
                 newline = True
 
-            while not self.style.styles_token(ttype) and ttype.parent:
-                ttype = ttype.parent
-            style = self.style.style_for_token(ttype)
-            buf = []
-            if style['bgcolor']:
-                buf.append(r'\cb%d' % color_mapping[style['bgcolor']])
-            if style['color']:
-                buf.append(r'\cf%d' % color_mapping[style['color']])
-            if style['bold']:
-                buf.append(r'\b')
-            if style['italic']:
-                buf.append(r'\i')
-            if style['underline']:
-                buf.append(r'\ul')
-            if style['border']:
-                buf.append(r'\chbrdr\chcfpat%d' %
-                           color_mapping[style['border']])
-            start = ''.join(buf)
-            if start:
-                outfile.write('{%s ' % start)
+            start = starts.get(ttype)
+            if start is None:
+                start = starts[ttype] = self._get_start(ttype, color_mapping)
+            # Adjacent runs of the same style share one group, whatever
+            # their token types.
+            if start != group:
+                if group:
+                    outfile.write('}')
+                if start:
+                    outfile.write('{%s ' % start)
+                group = start
             # TB 09/09/2012: Replacing previous code to write escaped line to output
             # with new code that reindents input.
             # outfile.write(self._escape_text(value))
@@ -249,7 +295,6 @@ class CHRtfFormatter(Formatter):
                 outfile.write(self._escape_text(line))
                 newline = False
 
-            if start:
-                outfile.write('}')
-
+        if group:
+            outfile.write('}')
         outfile.write('}')
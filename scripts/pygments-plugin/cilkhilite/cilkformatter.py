@@ -15,14 +15,24 @@
 """
 
 import re
+from io import StringIO
+from itertools import chain
 
 from pygments.formatter import Formatter
 from pygments.token import Token, STANDARD_TYPES
-from pygments.util import get_bool_opt, get_int_opt, StringIO
+from pygments.util import get_bool_opt, get_int_opt
+
+from cilkhilite.hidden import get_hide_opt, resolve_hidebydefault
+from cilkhilite.profiling import profiled
+from cilkhilite.trace import traced
 
 
 __all__ = ['CilkBookFormatter']
 
+# Sentinel token ending the token stream in the formatting loop.  Its
+# type is not a token type, so it starts a run of its own.
+_END_OF_TOKENS = ((object(), ''),)
+
 
 def escape_tex(text, commandprefix):
     return text.replace('\\', '\x00'). \
@@ -98,7 +108,7 @@ DOC_TEMPLATE = r'''
 # * \PY resets the style, parses the classnames and then calls \PY@do.
 #
 # Tip: to read this code, print it out in substituted form using e.g.
-# >>> print STYLE_TEMPLATE % {'cp': 'PY'}
+# >>> print(STYLE_TEMPLATE % {'cp': 'PY'})
 
 STYLE_TEMPLATE = r'''
 \makeatletter
@@ -149,6 +159,61 @@ def _get_ttype_name(ttype):
     return fname + aname
 
 
+def _macro_letters(n):
+    """Return the <n>th (from 0) of the names a, b, ..., z, aa, ab, ..."""
+    letters = ''
+    n += 1
+    while n:
+        n, r = divmod(n - 1, 26)
+        letters = chr(ord('a') + r) + letters
+    return letters
+
+
+class _LineIndexFile(StringIO):
+    """Output buffer that records the source line shown on each line
+    of output, for the `lineindex` option.
+
+    `token` must be called with each token of the source, written or
+    not, before its text is written.  The newlines of a token that are
+    written are its first newlines, in order."""
+
+    def __init__(self):
+        StringIO.__init__(self)
+        self.counting = False
+        self.lines = []         # source line of each output line
+        self.tokenline = 1      # source line on which the token starts
+        self.nextline = 1
+        self.written = 0        # newlines of the token written so far
+        self.pending = False    # text written after the last newline
+
+    def token(self, value):
+        self.tokenline = self.nextline
+        self.nextline += value.count('\n')
+        self.written = 0
+
+    def write(self, s):
+        if self.counting and s:
+            for _ in range(s.count('\n')):
+                self.lines.append(self.tokenline + self.written)
+                self.written += 1
+            self.pending = not s.endswith('\n')
+        return StringIO.write(self, s)
+
+    def runs(self):
+        """Return the line index as a comma-separated list of ranges
+        ``first-last`` of source lines shown on consecutive output lines."""
+        lines = self.lines
+        if self.pending:
+            lines = lines + [self.tokenline + self.written]
+        runs = []
+        for line in lines:
+            if runs and runs[-1][1] + 1 == line:
+                runs[-1][1] = line
+            else:
+                runs.append([line, line])
+        return ','.join('%d-%d' % (first, last) for first, last in runs)
+
+
 class CilkBookFormatter(Formatter):
     r"""
     Format tokens as LaTeX code for Cilk book. This needs the
@@ -266,12 +331,36 @@ class CilkBookFormatter(Formatter):
         pygmentized output.  The ``'/** END HIDDEN **/'`` and
         ``'/** BEGIN HIDDEN **/'`` lines will also render the intervening
         lines of code visible in the pygmentized output (default: ``False``).
+        If set to ``'auto'``, code is hidden by default exactly when the
+        token stream contains such a marker.
         *Added in cilkhilite pygments plugin.*
 
     `reindent`
         If set to ``True``, reindents the visible pygmentized code such that
         the first line in each visible piece has no indentation (default:
         ``False``).  *Added in cilkhilite pygments plugin.*
+
+    `lineindex`
+        If set to ``True``, writes the line
+
+            \csname codehilite@lineindex\endcsname{1-12,30-41}%
+
+        before the Verbatim environment, listing the ranges of source
+        lines shown on consecutive lines of the output.  With it, the
+        ``\codehilitesourcelines`` macro of codehilite.sty selects the
+        output lines of a range of source lines, so that an excerpt of
+        a listing needs no pygmentize run of its own.  Ignored if
+        `inline` is set (default: ``False``).
+        *Added in cilkhilite pygments plugin.*
+
+    `stylemacros`
+        If set to ``True``, formats each token with a macro for the style
+        its classes resolve to, e.g. ``\PYa{text}`` instead of
+        ``\PY{k+kt}{text}``, so that TeX does not parse the classes of
+        every token.  Tokens without style are not wrapped at all.  The
+        macros are defined by `get_style_defs` with the same option and
+        style, in addition to ``\PY`` (default: ``False``).
+        *Added in cilkhilite pygments plugin.*
     """
     name = 'CilkBookFormatter'
     aliases = ['cilkbook']
@@ -293,15 +382,19 @@ class CilkBookFormatter(Formatter):
         self.mathescape = get_bool_opt(options, 'mathescape', False)
         # New options added with cilkhilite pygments plugin
         self.inline = get_bool_opt(options, 'inline', False)
-        self.hidebydefault = get_bool_opt(options, 'hidebydefault', False)
+        self.hidebydefault = get_hide_opt(options, 'hidebydefault', False)
         self.reindent = get_bool_opt(options, 'reindent', False)
+        self.lineindex = get_bool_opt(options, 'lineindex', False)
+        self.stylemacros = get_bool_opt(options, 'stylemacros', False)
 
         self._create_stylesheet()
 
 
     def _create_stylesheet(self):
         t2n = self.ttype2name = {Token: ''}
+        self.ttype2command = {}
         c2d = self.cmd2def = {}
+        n2w = self.name2wrappers = {}
         cp = self.commandprefix
 
         def rgbcolor(col):
@@ -314,35 +407,145 @@ class CilkBookFormatter(Formatter):
         for ttype, ndef in self.style:
             name = _get_ttype_name(ttype)
             cmndef = ''
+            # The (prefix, suffix) wrapped around the text by each of
+            # \PY@bf, \PY@it etc., for the stylemacros option.
+            wrappers = {}
             if ndef['bold']:
                 cmndef += r'\let\$$@bf=\textbf'
+                wrappers['bf'] = (r'\textbf{', '}')
             if ndef['italic']:
                 cmndef += r'\let\$$@it=\textit'
+                wrappers['it'] = (r'\textit{', '}')
             if ndef['underline']:
                 cmndef += r'\let\$$@ul=\underline'
+                wrappers['ul'] = (r'\underline{', '}')
             if ndef['roman']:
                 cmndef += r'\let\$$@ff=\textrm'
+                wrappers['ff'] = (r'\textrm{', '}')
             if ndef['sans']:
                 cmndef += r'\let\$$@ff=\textsf'
+                wrappers['ff'] = (r'\textsf{', '}')
             if ndef['mono']:
                 cmndef += r'\let\$$@ff=\textsf'
+                wrappers['ff'] = (r'\textsf{', '}')
             if ndef['color']:
                 cmndef += (r'\def\$$@tc##1{\textcolor[rgb]{%s}{##1}}' %
                            rgbcolor(ndef['color']))
+                wrappers['tc'] = (r'\textcolor[rgb]{%s}{' %
+                                  rgbcolor(ndef['color']), '}')
             if ndef['border']:
                 cmndef += (r'\def\$$@bc##1{\setlength{\fboxsep}{0pt}'
                            r'\fcolorbox[rgb]{%s}{%s}{\strut ##1}}' %
                            (rgbcolor(ndef['border']),
                             rgbcolor(ndef['bgcolor'])))
+                wrappers['bc'] = (r'\setlength{\fboxsep}{0pt}'
+                                  r'\fcolorbox[rgb]{%s}{%s}{\strut ' %
+                                  (rgbcolor(ndef['border']),
+                                   rgbcolor(ndef['bgcolor'])), '}')
             elif ndef['bgcolor']:
                 cmndef += (r'\def\$$@bc##1{\setlength{\fboxsep}{0pt}'
                            r'\colorbox[rgb]{%s}{\strut ##1}}' %
                            rgbcolor(ndef['bgcolor']))
+                wrappers['bc'] = (r'\setlength{\fboxsep}{0pt}'
+                                  r'\colorbox[rgb]{%s}{\strut ' %
+                                  rgbcolor(ndef['bgcolor']), '}')
             if cmndef == '':
                 continue
             cmndef = cmndef.replace('$$', cp)
             t2n[ttype] = name
             c2d[name] = cmndef
+            n2w[name] = wrappers
+
+        # With the stylemacros option, each distinct style that a token
+        # type resolves to, i.e. each distinct wrapper around its text,
+        # gets a macro of its own, shared by the combinations of styled
+        # classes that resolve to it.  A token type outside the style
+        # resolves like its nearest ancestor in the style, so the
+        # combinations of the token types of the style are all there
+        # are.  Plain text, the class '', is never wrapped.  The macros
+        # are numbered in the sorted order of their first combination,
+        # so that they are the same for every formatter with the same
+        # style.
+        combos = set(self._get_styled_classes(ttype) for ttype, _ in self.style)
+        combos.discard(())
+        combos.discard(('',))
+        self.classes2macro = {}
+        self.wrapper2macro = {}
+        for classes in sorted(combos):
+            wrapper = self._get_wrapper(classes)
+            if wrapper == ('', ''):
+                continue
+            macro = self.wrapper2macro.get(wrapper)
+            if macro is None:
+                macro = self.wrapper2macro[wrapper] = \
+                    cp + _macro_letters(len(self.wrapper2macro))
+            self.classes2macro[classes] = macro
+
+    def _get_styled_classes(self, ttype):
+        """Return the tuple of the classes of <ttype> that the style
+        defines, from the least to the most specific."""
+        t2n = self.ttype2name
+        classes = []
+        while ttype is not Token:
+            if ttype in t2n:
+                classes.append(t2n[ttype])
+            ttype = ttype.parent
+        return tuple(reversed(classes))
+
+    def _get_command(self, ttype):
+        """Return the start of the command that formats text of type
+        <ttype>, e.g. ``\\PY{k+kt}{``, or ``''`` for plain text.  The
+        result is cached in `ttype2command`."""
+        t2n = self.ttype2name
+        styles = []
+        parent = ttype
+        while parent is not Token:
+            try:
+                styles.append(t2n[parent])
+            except KeyError:
+                # not in current style
+                styles.append(_get_ttype_name(parent))
+            parent = parent.parent
+        styleval = '+'.join(reversed(styles))
+        if not styleval:
+            # Plain text is not wrapped, whatever the style of Text.
+            command = ''
+        elif self.stylemacros:
+            macro = self.classes2macro.get(self._get_styled_classes(ttype))
+            command = macro and '\\%s{' % macro or ''
+        else:
+            command = '\\%s{%s}{' % (self.commandprefix, styleval)
+        self.ttype2command[ttype] = command
+        return command
+
+    def _get_wrapper(self, classes):
+        """Return the (prefix, suffix) pair that the styled <classes>
+        wrap around the text of a token."""
+        # Later classes override earlier ones, as in \PY@toks.
+        wrappers = {}
+        for name in classes:
+            wrappers.update(self.name2wrappers[name])
+        # Wrap the text as \PY@do does.
+        prefix = suffix = ''
+        for slot in ('bc', 'tc', 'ul', 'it', 'bf', 'ff'):
+            if slot in wrappers:
+                prefix += wrappers[slot][0]
+                suffix = wrappers[slot][1] + suffix
+        return prefix, suffix
+
+    def _get_macro_defs(self):
+        """Return the definitions of the macros of the stylemacros
+        option, one per line, each followed by a comment listing the
+        combinations of classes that use it."""
+        users = {}
+        for classes, macro in self.classes2macro.items():
+            users.setdefault(macro, []).append('+'.join(classes))
+        defs = []
+        for (prefix, suffix), macro in sorted(self.wrapper2macro.items(),
+                                              key=lambda item: item[1]):
+            defs.append(r'\def\%s#1{%s#1%s}%% %s' %
+                        (macro, prefix, suffix, ' '.join(sorted(users[macro]))))
+        return '\n'.join(defs)
 
     def get_style_defs(self, arg=''):
         """
@@ -351,21 +554,30 @@ class CilkBookFormatter(Formatter):
         """
         cp = self.commandprefix
         styles = []
-        for name, definition in self.cmd2def.iteritems():
+        for name, definition in self.cmd2def.items():
             styles.append(r'\expandafter\def\csname %s@tok@%s\endcsname{%s}' %
                           (cp, name, definition))
+        if self.stylemacros:
+            styles.append(self._get_macro_defs())
         return STYLE_TEMPLATE % {'cp': self.commandprefix,
                                  'styles': '\n'.join(styles)}
 
+    @traced('formatter')
+    @profiled
     def format_unencoded(self, tokensource, outfile):
         # TODO: add support for background colors
-        t2n = self.ttype2name
-        cp = self.commandprefix
 
         if self.full:
             realoutfile = outfile
             outfile = StringIO()
 
+        # The line index goes before the Verbatim environment, so the
+        # environment is buffered until the index is known.
+        lineindex = None
+        if self.lineindex and not self.inline:
+            indexoutfile = outfile
+            outfile = lineindex = _LineIndexFile()
+
         # TB: Added support for "inline" feature
         if not self.inline:
             # TB: Added support for custom Verbatim environment definition.
@@ -389,8 +601,10 @@ class CilkBookFormatter(Formatter):
         # TB: Added functionality to skip formatting content between
         # Comment.Invisible.Begin and Comment.Invisible.End tokens.
         # If self.hidebydefault, then assume the file begins with a
-        # Comment.Invisible.Begin token.
-        skiptoken = self.hidebydefault
+        # Comment.Invisible.Begin token.  With hidebydefault=auto, this
+        # is decided from the tokens (see cilkhilite.hidden).
+        skiptoken, tokensource = resolve_hidebydefault(self.hidebydefault,
+                                                       tokensource)
         # TB: Added functionality to reindent the output such that the
         # first line has no indentation.  The way this works is that
         # we measure the whitespace prefix on the first line we output
@@ -408,7 +622,37 @@ class CilkBookFormatter(Formatter):
         # output a newline.
         wrotelines = False
 
-        for ttype, value in tokensource:
+        t2c = self.ttype2command
+        # Adjacent tokens of the same type are merged into one run, as
+        # by the tokenmerge filter, and each run is formatted as one
+        # token.  The sentinel at the end of the stream flushes the last
+        # run.
+        runtype = None
+        runvalue = ''
+        # Runs formatted by the same command, e.g. of token types that
+        # stylemacros maps to the same macro, share one command on each
+        # line: the command of the last text written is left open until
+        # a newline or text of another command is written.
+        opencommand = ''
+
+        if lineindex is not None:
+            lineindex.counting = True
+        for ttype, value in chain(tokensource, _END_OF_TOKENS):
+            # Current Pygments lexes whitespace as Text.Whitespace.  Format
+            # it as plain text, as older versions did, so that it is
+            # not wrapped in style commands and can be reindented.
+            if ttype in Token.Text.Whitespace:
+                ttype = Token.Text
+            if ttype is runtype:
+                runvalue += value
+                continue
+            ttype, runtype = runtype, ttype
+            value, runvalue = runvalue, value
+            if ttype is None:
+                continue
+
+            if lineindex is not None:
+                lineindex.token(value)
             if ttype in Token.Comment.Invisible.End:
                 skiptoken = False
                 continue
@@ -432,6 +676,9 @@ class CilkBookFormatter(Formatter):
                 # Insert any newlines at beginning of value
                 newline_match = re.match(r'^\n+', value)
                 if newline_match is not None:
+                    if opencommand:
+                        outfile.write('}')
+                        opencommand = ''
                     outfile.write(newline_match.group(0))
                     newline = True
                     value = value[newline_match.end():]
@@ -459,7 +706,7 @@ class CilkBookFormatter(Formatter):
                         
                     #     # Try to guess comment starting lexeme and escape it ...
                     #     start = value[0:1]
-                    #     for i in xrange(1, len(value)):
+                    #     for i in range(1, len(value)):
                     #         if start[0] != value[i]:
                     #             break
                     #         start += value[i]
@@ -472,7 +719,7 @@ class CilkBookFormatter(Formatter):
 
                     # Try to guess comment starting lexeme and escape it ...
                     start = value[0:1]
-                    for i in xrange(1, len(value)):
+                    for i in range(1, len(value)):
                         if start[0] != value[i]:
                             break
                         start += value[i]
@@ -495,25 +742,29 @@ class CilkBookFormatter(Formatter):
                     value = escape_tex(value, self.commandprefix)
             elif ttype not in Token.Comment.PureTeX:
                 value = escape_tex(value, self.commandprefix)
-            styles = []
-            while ttype is not Token:
-                try:
-                    styles.append(t2n[ttype])
-                except KeyError:
-                    # not in current style
-                    styles.append(_get_ttype_name(ttype))
-                ttype = ttype.parent
-            styleval = '+'.join(reversed(styles))
-            if styleval:
+            command = t2c.get(ttype)
+            if command is None:
+                command = self._get_command(ttype)
+            if opencommand and command != opencommand:
+                outfile.write('}')
+                opencommand = ''
+            if command:
                 spl = value.split('\n')
                 for line in spl[:-1]:
-                    if line:
-                        outfile.write("\\%s{%s}{%s}" % (cp, styleval, line))
+                    if line and not opencommand:
+                        outfile.write(command)
+                        opencommand = command
+                    if opencommand:
+                        outfile.write(line + '}')
+                        opencommand = ''
                     newline = True
                     outfile.write('\n')
                     wrotelines = True
                 if spl[-1]:
-                    outfile.write("\\%s{%s}{%s}" % (cp, styleval, spl[-1]))
+                    if not opencommand:
+                        outfile.write(command)
+                        opencommand = command
+                    outfile.write(spl[-1])
                     wrotelines = True
 
             else:
@@ -540,6 +791,11 @@ class CilkBookFormatter(Formatter):
                     wrotelines = True
                     newline = False
 
+        if opencommand:
+            outfile.write('}')
+        if lineindex is not None:
+            lineindex.counting = False
+
         if not self.inline:
             if not wrotelines:
                 outfile.write('\n')
@@ -547,6 +803,12 @@ class CilkBookFormatter(Formatter):
             # outfile.write('\\end{Verbatim}\n')
             outfile.write('\\end{' + self.verbenvironment + '}\n')
 
+        if lineindex is not None:
+            outfile = indexoutfile
+            outfile.write('\\csname codehilite@lineindex\\endcsname{%s}%%\n' %
+                          lineindex.runs())
+            outfile.write(lineindex.getvalue())
+
         if self.full:
             realoutfile.write(DOC_TEMPLATE %
                 dict(docclass  = self.docclass,
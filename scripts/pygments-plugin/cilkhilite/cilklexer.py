@@ -8,8 +8,8 @@
     :copyright: Copyright 2013 by Tao B. Schardl, Warut Suksompong
     :license: BSD
 
-    Based on CppLexer from pygments.lexers.compiled,
-    PythonLexer from pygments.lexers.agile, and
+    Based on CppLexer from pygments.lexers.c_cpp,
+    PythonLexer from pygments.lexers.python, and
     JavaLexer from pygments.lexers.jvm.
     GasLexer from pygments.lexers.asm.
 
@@ -17,23 +17,68 @@
     :license: BSD, see LICENSE for details.
 """
 
+import copy
 import re
 
 from pygments.lexer import Lexer, RegexLexer, DelegatingLexer, \
     include, bygroups, using, this, combined, inherit
 from pygments.lexers.asm import GasLexer, ObjdumpLexer
-from pygments.lexers.compiled import CppLexer
+from pygments.lexers.c_cpp import CppLexer
 from pygments.lexers.jvm import JavaLexer
-from pygments.lexers.agile import PythonLexer
+from pygments.lexers.python import PythonLexer
 from pygments.util import get_bool_opt, get_list_opt
 from pygments.token import Text, Comment, Operator, Keyword, Name, String, \
      Number, Punctuation, Error, Literal, Token, Other
 
-__all__ = ['CilkLexer', 'PythonCBLexer', 'JavaCBLexer', 'GasCBLexer', 'ObjdumpCBLexer', 'CilkObjdumpLexer']
+from cilkhilite.hidden import get_hide_opt, skip_hidden
+from cilkhilite.trace import traced_lexer
 
+__all__ = ['CilkLexer', 'CilkFastLexer', 'PythonCBLexer', 'JavaCBLexer', 'GasCBLexer', 'ObjdumpCBLexer', 'CilkObjdumpLexer']
+
+# "/// Types:" and "/// Keywords:" comments.  Group 5 holds the names.
+_types_comment = r'([ \t\f\v]*/(\\\n)?/(\\\n)?/(\s*Types:))(.*?[^\\]\n)'
+_types_block_comment = r'([ \t\f\v]*/([*][*][*])((\s*)Types:))(.*?)([*](\\\n)?[*](\\\n)?[*](\\\n)?/)'
+_keywords_comment = r'([ \t\f\v]*/(\\\n)?/(\\\n)?/(\s*Keywords:))(.*?[^\\]\n)'
+
+_declaration_comments = [
+    (re.compile(_types_comment, re.MULTILINE), 'customtypes_callback'),
+    (re.compile(_types_block_comment, re.MULTILINE), 'customtypes_callback'),
+    (re.compile(_keywords_comment, re.MULTILINE), 'customkeywords_callback'),
+    ]
+
+
+def _scan_declarations(lexer, text):
+    """Record the names declared by the "/// Types:" and "/// Keywords:"
+    comments in <text>, which is not lexed, on <lexer>."""
+    for regex, callback in _declaration_comments:
+        for match in regex.finditer(text):
+            for _ in getattr(lexer, callback)(match):
+                pass
+
+
+@traced_lexer
 class CilkLexer(CppLexer):
     """
     For Cilk source code.
+
+    Like the other cilkhilite lexers, a CilkLexer instance may be shared
+    between threads.
+
+    Additional options accepted:
+
+    `skiphidden`
+        If set to ``True``, only the code that the formatters will show
+        is lexed, and each hidden region is emitted as a single
+        ``Comment.Invisible.Hidden`` token (see
+        `cilkhilite.hidden.skip_hidden`).  Types and keywords declared
+        in ``/// Types:`` and ``/// Keywords:`` comments in hidden
+        regions are still recorded, but typedefs and class definitions
+        there are not.  (default: ``False``)
+
+    `hidebydefault`
+        With `skiphidden`, whether the code starts hidden, as for the
+        formatters: ``True``, ``False`` or ``auto``.
+        (default: ``False``)
     """
     name = 'Cilk'
     aliases = ['cilk']    
@@ -49,9 +94,33 @@ class CilkLexer(CppLexer):
     _ws1 = r'\s*/[*].*?[*]/\s*'
     _ws01 = r'\s*|' + _ws1
 
-    _custom_types = []
-    _custom_keywords = []
-    
+    # Names declared by "/// Types:" and "/// Keywords:" comments, typedefs
+    # and class definitions.  These are only set on the per-call copy of
+    # the lexer made in get_tokens_unprocessed, so one CilkLexer can be
+    # used by several threads at once, and names declared in one source
+    # do not leak into the next.
+    _custom_types = ()
+    _custom_keywords = ()
+
+    def __init__(self, **options):
+        self.skiphidden = get_bool_opt(options, 'skiphidden', False)
+        self.hidebydefault = get_hide_opt(options, 'hidebydefault', False)
+        CppLexer.__init__(self, **options)
+
+    def get_tokens_unprocessed(self, text, *args):
+        if '_custom_types' in self.__dict__:
+            # Nested call through using(this): share the caller's names.
+            return CppLexer.get_tokens_unprocessed(self, text, *args)
+        lexer = copy.copy(self)
+        lexer._custom_types = []
+        lexer._custom_keywords = []
+        if self.skiphidden and not args:
+            return skip_hidden(
+                text, self.hidebydefault,
+                lambda code: CppLexer.get_tokens_unprocessed(lexer, code),
+                lambda code: _scan_declarations(lexer, code))
+        return CppLexer.get_tokens_unprocessed(lexer, text, *args)
+
     def customtypes_callback(lexer, match):
         comment_head = match.group(1)
         type_list = match.group(5)
@@ -146,13 +215,10 @@ class CilkLexer(CppLexer):
              bygroups(Comment.Invisible.Begin, Comment.Invisible.End)),
 
             # TB: Adding support for custom types
-            (r'([ \t\f\v]*/(\\\n)?/(\\\n)?/(\s*Types:))(.*?[^\\]\n)',
-             customtypes_callback),
-            (r'([ \t\f\v]*/([*][*][*])((\s*)Types:))(.*?)([*](\\\n)?[*](\\\n)?[*](\\\n)?/)',
-             customtypes_callback),
+            (_types_comment, customtypes_callback),
+            (_types_block_comment, customtypes_callback),
 
-            (r'([ \t\f\v]*/(\\\n)?/(\\\n)?/(\s*Keywords:))(.*?[^\\]\n)', 
-             customkeywords_callback),
+            (_keywords_comment, customkeywords_callback),
 
             # TB: Added support to make blocks of code invisible.
             (r'[ \t\f\v]*/(\\\n)?/(\\\n)?/(\s*<<)(\n|(.|\n)*?[^\\]\n)',Comment.Invisible.End),
@@ -261,31 +327,31 @@ class CilkLexer(CppLexer):
 
             # Predicated Keywords
             (r'(switch)\b'
-             r'(' + _ws01 + ')*?(\()',
+             r'(' + _ws01 + r')*?(\()',
              bygroups(Keyword.Predicated,
                       using(this), Punctuation),
              'switch-pred'),
 
             (r'(while|if)\b'
-             r'(' + _ws01 + ')*?(\()',
+             r'(' + _ws01 + r')*?(\()',
              bygroups(Keyword.Predicated,
                       using(this), Punctuation),
              'block'),
 
             (r'(for)\b'
-             r'(' + _ws01 + ')*?(\()',
+             r'(' + _ws01 + r')*?(\()',
              bygroups(Keyword.Predicated,
                       using(this), Punctuation),
              'block-for'),
 
             (r'(pipe_while)\b'
-             r'(' + _ws01 + ')*?(\()',
+             r'(' + _ws01 + r')*?(\()',
              bygroups(Keyword.Predicated,
                       using(this), Punctuation),
              'block'),
 
             (r'(cilk_for|pipe_for)\b'
-             r'(' + _ws01 + ')*?(\()',
+             r'(' + _ws01 + r')*?(\()',
              bygroups(Keyword.Cilk.Predicated,
                       using(this), Punctuation),
              'block-for'),
@@ -296,7 +362,7 @@ class CilkLexer(CppLexer):
              r'(?=(\s+|' + _ws1 + ')[a-zA-Z_][a-zA-Z0-9_]*)',
              Keyword, 'classname'),
 
-            (r'(struct|union)(?=(\s+|' + _ws1 + ')([a-zA-Z_][a-zA-Z0-9_]*[a-zA-Z0-9_:*,\s]*?)?[<{])',
+            (r'(struct|union)(?=(\s+|' + _ws1 + r')([a-zA-Z_][a-zA-Z0-9_]*[a-zA-Z0-9_:*,\s]*?)?[<{])',
              Keyword, 'struct'),
 
             (r'(struct|union)(\s+|' + _ws1 + ')([a-zA-Z_][a-zA-Z0-9_]*)',
@@ -366,7 +432,7 @@ class CilkLexer(CppLexer):
             #  r'(?=(?:\s*[<][^;{}()~!%^+=|?/\-]+?[>])?(?:[\s*]+?)(?:[a-zA-Z_][a-zA-Z0-9_]*\b))',
             #  Keyword.Type),
             (r'([a-zA-Z_][a-zA-Z0-9_]*)\b'
-             r'(?=(?:(' + _ws01 + ')[<][^;{}()~!%^+=|?/\-]+?[>])?(?:[\s*&]+?)(?:[a-zA-Z_][a-zA-Z0-9_]*))',
+             r'(?=(?:(' + _ws01 + r')[<][^;{}()~!%^+=|?/\-]+?[>])?(?:[\s*&]+?)(?:[a-zA-Z_][a-zA-Z0-9_]*))',
              Keyword.Type),
             ],
         'switch-pred': [
@@ -386,7 +452,7 @@ class CilkLexer(CppLexer):
             include('keywords'),
 
             (r'([a-zA-Z_][a-zA-Z0-9_]*)\b'
-             r'(?=(?:(' + _ws01 + ')*?[<][^;{}()~!%^&+=|?<>/\-]+?[>])?(?:[\s*&]+?)(?:[a-zA-Z_][a-zA-Z0-9_]*))',
+             r'(?=(?:(' + _ws01 + r')*?[<][^;{}()~!%^&+=|?<>/\-]+?[>])?(?:[\s*&]+?)(?:[a-zA-Z_][a-zA-Z0-9_]*))',
              Keyword.Type, 'variable'),
 
             (r'[~!%^&*+=|?:<>/-]', Operator, ('#pop', 'switch-novardef')),
@@ -724,8 +790,8 @@ class CilkLexer(CppLexer):
             include('whitespace'),
             include('statements'),
 
-            ('[\[]', Operator, '#push'),
-            ('[\]]', Operator, '#pop'),
+            (r'[\[]', Operator, '#push'),
+            (r'[\]]', Operator, '#pop'),
 
             include('type-cast'),
             # Early termination of an assignment
@@ -773,7 +839,7 @@ class CilkLexer(CppLexer):
             # Calling a constructor does not color the cunstructor
             # name as a type.
             (r'([a-zA-Z_][a-zA-Z0-9_]*)\b'
-             r'(?=(' + _ws01 + ')(\())', Name),
+             r'(?=(' + _ws01 + r')(\())', Name),
 
             # Check if this word is a type
             (r'([a-zA-Z_][a-zA-Z0-9_]*)', checkcustom_callback),
@@ -825,7 +891,7 @@ class CilkLexer(CppLexer):
             # functions
             (r'([a-zA-Z_][a-zA-Z0-9_]*)\b((?:[a-zA-Z0-9_*&<>:,\s]*?[*&\s]+?))'  # return type
              r'(?=(?:(([a-zA-Z_][a-zA-Z0-9_]*)\b'
-             r'((' + _ws01 + ')[<][^;{}()~!%^+=|?/\-]+?[>])?'
+             r'((' + _ws01 + r')[<][^;{}()~!%^+=|?/\-]+?[>])?'
              r'(' + _ws01 + ')*?(::)(' + _ws01 + ')*?)'
              r'([a-zA-Z_][a-zA-Z0-9_]*)\s*\())',
              bygroups(Keyword.Type, using(this)), 'decl'),
@@ -835,7 +901,7 @@ class CilkLexer(CppLexer):
              r'((?:\s*[<][^;{}()~!%^+=|?/\-]+?[>])?)(' + _ws01 + ')*?(::)(' + _ws01 + ')*?'  # return type
              r'(~)?(' + _ws01 + ')*?'
              r'(\1)\b'                          # method name
-             r'(' + _ws01 + ')*?(\()',
+             r'(' + _ws01 + r')*?(\()',
              bygroups(Keyword.Type, using(this),
                       using(this), Operator, using(this),
                       Operator, using(this), Name.Function,
@@ -880,7 +946,7 @@ class CilkLexer(CppLexer):
             include('keywords'),
 
             (r'([a-zA-Z_][a-zA-Z0-9_]*)\b'
-             r'(?=(?:(' + _ws01 + ')[<][^;{}()~!%^+=|?/\-]+?[>]))',
+             r'(?=(?:(' + _ws01 + r')[<][^;{}()~!%^+=|?/\-]+?[>]))',
              Keyword.Type, ('#pop', 'function-args')),
 
             include('namespace'),
@@ -954,7 +1020,7 @@ class CilkLexer(CppLexer):
             #  Keyword.Type, 'variable'),
 
             (r'([a-zA-Z_][a-zA-Z0-9_]*)\b'
-             r'(?=(?:(' + _ws01 + ')*?[<][^;{}()~!%^&+=|?<>/\-]+?[>])?(?:([\s&*]|' + _ws1 + ')+?)(?:[a-zA-Z_][a-zA-Z0-9_]*))',
+             r'(?=(?:(' + _ws01 + r')*?[<][^;{}()~!%^&+=|?<>/\-]+?[>])?(?:([\s&*]|' + _ws1 + ')+?)(?:[a-zA-Z_][a-zA-Z0-9_]*))',
              Keyword.Type.BLOCK, 'variable'),
 
             (r'[~!%^&*+=|?:<>/-]', Operator, ('#pop', 'block-novardef')),
@@ -1000,18 +1066,18 @@ class CilkLexer(CppLexer):
             # TB: Attempt to detect type casting
             (r'(\()(' + _ws01 + ')'
              r'([a-zA-Z_][a-zA-Z0-9_]*)\b'
-             r'(' + _ws01 + ')([*]+)(' + _ws01 + ')(\))',
+             r'(' + _ws01 + ')([*]+)(' + _ws01 + r')(\))',
              bygroups(Operator, using(this), Keyword.Type, using(this),
                       Operator, using(this), Operator)),
 
             (r'(\()(' + _ws01 + ')'
              r'(unsigned|signed)'
-             r'(' + _ws01 + ')([a-zA-Z_][a-zA-Z0-9_]*)(' + _ws01 + ')(\))',
+             r'(' + _ws01 + ')([a-zA-Z_][a-zA-Z0-9_]*)(' + _ws01 + r')(\))',
              bygroups(Operator.TYPECAST, using(this), Keyword.Type, using(this),
                       Keyword.Type, using(this), Operator)),
 
             (r'(\()(' + _ws01 + ')'
-             r'([a-zA-Z_][a-zA-Z0-9_<>&*:,\s]*?)(' + _ws01 + ')([*]+)(' + _ws01 + ')(\))',
+             r'([a-zA-Z_][a-zA-Z0-9_<>&*:,\s]*?)(' + _ws01 + ')([*]+)(' + _ws01 + r')(\))',
              bygroups(Operator, using(this), Operator, using(this), Operator)),
             ],
         'class': [
@@ -1021,8 +1087,8 @@ class CilkLexer(CppLexer):
             include('whitespace'),
 
             # overloaded operator
-            (r'(operator)(' + _ws01 + ')([*/+-=&()<>!~^|?\[\]]+?)'      # operator name
-             r'(' + _ws01 + ')(\()',
+            (r'(operator)(' + _ws01 + r')([*/+-=&()<>!~^|?\[\]]+?)'      # operator name
+             r'(' + _ws01 + r')(\()',
              bygroups(Keyword, using(this), Name.Function, using(this),
                       Punctuation),
              'function-args-start'),
@@ -1036,7 +1102,7 @@ class CilkLexer(CppLexer):
 
             # member functions
             (r'([a-zA-Z_][a-zA-Z0-9_]*)\b'         # method name
-             r'(' + _ws01 + ')(\()',
+             r'(' + _ws01 + r')(\()',
              bygroups(Name.Function, using(this),
                       Punctuation),
              'function-args-start'),
@@ -1049,7 +1115,7 @@ class CilkLexer(CppLexer):
              Keyword.Type),
 
             (r'[<]', Punctuation, 'type'),
-            (r'(:)(' + _ws01 + ')*?(\d+[LlUu]*)',
+            (r'(:)(' + _ws01 + r')*?(\d+[LlUu]*)',
              bygroups(Operator, using(this), Number.Integer)),
 
             (r'[~*&]', Operator),
@@ -1092,6 +1158,180 @@ class CilkLexer(CppLexer):
     def analyse_text(text):
         return 0.1
 
+
+@traced_lexer
+class CilkFastLexer(RegexLexer):
+    """
+    A fast lexer for very large Cilk listings, such as generated code and
+    appendix dumps.
+
+    CilkFastLexer keeps the invisible, PureTeX, hide/show and emphasis
+    comment markers, ``#line`` macros and the Cilk keywords of
+    `CilkLexer`, and its tokens can be formatted with the same
+    formatters.  It does not infer declarations, however: identifiers are
+    plain names, except for keywords, the built-in types, names ending in
+    ``_t`` and names declared in a ``/// Types:`` or ``/// Keywords:``
+    comment.
+
+    CilkFastLexer accepts the `skiphidden` and `hidebydefault` options of
+    `CilkLexer`.
+    """
+    name = 'Cilk (fast)'
+    aliases = ['cilkfast']
+    filenames = []
+    mimetypes = []
+
+    # Token types of reserved words.  Identifiers are matched by a single
+    # rule and looked up here, which is much cheaper than trying a rule
+    # per keyword group at every position.
+    _words = {}
+    for _tokentype, _wordlist in [
+            (Keyword, 'auto break case const continue default do else enum '
+             'extern goto register restricted return sizeof static struct '
+             'typedef union volatile asm catch class const_cast delete '
+             'dynamic_cast explicit export friend mutable namespace new '
+             'operator private protected public reinterpret_cast '
+             'static_cast template this throw throws try typeid using '
+             'virtual'),
+            (Keyword.Predicated, 'if while for switch pipe_while'),
+            (Keyword.Reserved, ' '.join(_prefix + _word
+                                        for _prefix in ('', '_', '__')
+                                        for _word in ('inline', 'naked',
+                                                      'restrict', 'thread',
+                                                      'typename'))),
+            (Keyword.Type, 'bool int long float short double char unsigned '
+             'signed void'),
+            (Keyword.Cilk, 'cilk_spawn cilk_sync _Cilk_spawn _Cilk_sync '
+             '_Cilk_for'),
+            (Keyword.Cilk.Predicated, 'cilk_for pipe_for'),
+            (Name.Builtin, 'true false NULL nullptr'),
+            (Name.Namespace, 'std')]:
+        for _word in _wordlist.split():
+            _words[_word] = _tokentype
+    del _tokentype, _wordlist, _word
+
+    # Names declared by "/// Types:" and "/// Keywords:" comments, set on
+    # the per-call copy of the lexer as in CilkLexer.
+    _custom_types = ()
+    _custom_keywords = ()
+
+    def __init__(self, **options):
+        self.skiphidden = get_bool_opt(options, 'skiphidden', False)
+        self.hidebydefault = get_hide_opt(options, 'hidebydefault', False)
+        RegexLexer.__init__(self, **options)
+
+    def get_tokens_unprocessed(self, text, *args):
+        lexer = copy.copy(self)
+        lexer._custom_types = types = set()
+        lexer._custom_keywords = keywords = set()
+        words = self._words
+        if self.skiphidden and not args:
+            tokens = skip_hidden(
+                text, self.hidebydefault,
+                lambda code: RegexLexer.get_tokens_unprocessed(lexer, code),
+                lambda code: _scan_declarations(lexer, code))
+        else:
+            tokens = RegexLexer.get_tokens_unprocessed(lexer, text, *args)
+        for index, token, value in tokens:
+            if token is Name:
+                if value in types:
+                    token = Keyword.Type
+                elif value in keywords:
+                    token = Keyword.Custom
+                else:
+                    token = words.get(value, Name)
+                    if token is Name and value.endswith('_t') and \
+                            len(value) > 2:
+                        token = Keyword.Type
+            yield index, token, value
+
+    def customtypes_callback(lexer, match):
+        lexer._custom_types.update(match.group(5).split())
+        yield match.start(), Comment.Invisible, match.group(0)
+
+    def customkeywords_callback(lexer, match):
+        lexer._custom_keywords.update(match.group(5).split())
+        yield match.start(), Comment.Invisible, match.group(1) + match.group(5)
+
+    tokens = {
+        'root': [
+            # The common tokens come first.  None of these rules matches
+            # whitespace before a "/" or a "#", so the marker rules below
+            # still see the indentation that belongs to a marker.
+            (r'[a-zA-Z_][a-zA-Z0-9_]*(?=[^"\'a-zA-Z0-9_])', Name),
+            (r'[ \t\f\v]+(?![/# \t\f\v])', Text),
+            (r'\n', Text),
+            (r'[()\[\]{},.;]', Punctuation),
+            (r'::|[~!%^&*+=|?:<>-]', Operator),
+            (r'(\d+\.\d*|\.\d+|\d+)[eE][+-]?\d+[LlFf]?', Number.Float),
+            (r'(\d+\.\d*|\.\d+|\d+[fF])[fF]?', Number.Float),
+            (r'0x[0-9a-fA-F]+[LlUu]*', Number.Hex),
+            (r'0[0-7]+[LlUu]*', Number.Oct),
+            (r'\d+[LlUu]*', Number.Integer),
+            (r'(L|u8|u|U)?"', String, 'string'),
+            (r"(L|u8|u|U)?'(\\.|\\[0-7]{1,3}|\\x[a-fA-F0-9]{1,2}|[^\\\'\n])'",
+             String.Char),
+            (r'[a-zA-Z_][a-zA-Z0-9_]*', Name),
+
+            # The marker rules are those of CilkLexer's 'whitespace' state.
+            (r'^(\s*#line)(\s+\d\n)',
+             bygroups(Comment.Invisible.Begin, Comment.Invisible.End)),
+            (_types_comment, customtypes_callback),
+            (_types_block_comment, customtypes_callback),
+            (_keywords_comment, customkeywords_callback),
+            (r'[ \t\f\v]*/(\\\n)?/(\\\n)?/(\s*<<)(\n|(.|\n)*?[^\\]\n)',
+             Comment.Invisible.End),
+            (r'[ \t\f\v]*/(\\\n)?/(\\\n)?/(\s*>>)(\n|(.|\n)*?[^\\]\n)',
+             Comment.Invisible.Begin),
+            (r'[ \t\f\v]*/(\\\n)?/(\\\n)?/(\s*\[\[)(\n|(.|\n)*?[^\\]\n)',
+             Comment.Emph.Begin),
+            (r'[ \t\f\v]*/(\\\n)?/(\\\n)?/(\s*\]\])(\n|(.|\n)*?[^\\]\n)',
+             Comment.Emph.End),
+            (r'[ \t\f\v]*(/(\\\n)?/(\\\n)?/)(.*?[^\\]\n)',
+             bygroups(Comment.Invisible, None, None, Comment.PureTeX)),
+            (r'(\\[a-zA-Z_][^\n]*?)(\n)',
+             bygroups(Comment.PureTex, Text)),
+            (r'(//)([^\n]*?)(///)([^\n]*?)(\n)',
+             bygroups(Comment.Single, Comment.Single, Comment.Invisible,
+                      Comment.PureTeX, Comment.Single)),
+
+            (r'^([ \t\f\v]*)(#)', bygroups(Text, Comment.Preproc), 'macro'),
+            (r'[ \t\f\v]+', Text),
+            (r'\\\n', Text),
+            (r'//(\n|[\w\W]*?[^\\]\n)', Comment.Single),
+            (r'/[*][\w\W]*?[*]/', Comment.Multiline),
+            (r'/', Operator),
+            (r'.', Text),
+            ],
+        'macro': [
+            (r'([ \t\f\v]*)(include)([ \t\f\v]*)([<"])([a-zA-Z0-9._/-]+)([>"])',
+             bygroups(Text, Comment.Preproc, Text, Comment.Preproc,
+                      Token.Preproc.Library, Comment.Preproc)),
+            (r'(///)(.*?\n)',
+             bygroups(Comment.Invisible, Comment.PureTeX), '#pop'),
+            (r'[^/\n\\]+', Comment.Preproc),
+            (r'/[*][\w\W]*?[*]/', Comment.Multiline),
+            (r'//.*?\n', Comment.Single, '#pop'),
+            (r'/', Comment.Preproc),
+            (r'\\\n', Comment.Preproc),
+            (r'\\', Comment.Preproc),
+            (r'\n', Comment.Preproc, '#pop'),
+            ],
+        'string': [
+            (r'"', String, '#pop'),
+            (r'\\([\\abfnrtv"\']|x[a-fA-F0-9]{2,4}|[0-7]{1,3})',
+             String.Escape),
+            (r'[^\\"\n]+', String),
+            (r'\\\n', String),
+            (r'\\', String),
+            (r'\n', String, '#pop'),
+            ],
+        }
+
+    def analyse_text(text):
+        return 0.0
+
+@traced_lexer
 class PythonCBLexer(PythonLexer):
     """
     For `Python <http://www.python.org>`_ source code.
@@ -1112,6 +1352,7 @@ class PythonCBLexer(PythonLexer):
     def analyse_text(text):
         return 0.1
 
+@traced_lexer
 class JavaCBLexer(JavaLexer):
     """
     For `Java <http://www.sun.com/java/>`_ source code.
@@ -1133,6 +1374,7 @@ class JavaCBLexer(JavaLexer):
         return 0.1
 
 
+@traced_lexer
 class GasCBLexer(GasLexer):
     """
     For Gas (AT&T) assembly code.
@@ -1144,7 +1386,7 @@ class GasCBLexer(GasLexer):
     mimetypes = ['text/x-gas']
 
     char = r'[a-zA-Z$._0-9@-]'
-    identifier = r'(?:[a-zA-Z$_]' + char + '*|\.' + char + '+)'
+    identifier = r'(?:[a-zA-Z$_]' + char + r'*|\.' + char + '+)'
     number = r'(?:0[xX][a-zA-Z0-9]+|\d+)'
 
     tokens = {
@@ -1221,6 +1463,7 @@ class GasCBLexer(GasLexer):
         }
 
 
+@traced_lexer
 class ObjdumpCBLexer(ObjdumpLexer):
     """
     For the output of 'objdump -dr'
@@ -1243,6 +1486,7 @@ class ObjdumpCBLexer(ObjdumpLexer):
         }
 
 
+@traced_lexer
 class CilkObjdumpLexer(DelegatingLexer):
     """
     For the output of 'objdump -Sr on compiled Cilk files'
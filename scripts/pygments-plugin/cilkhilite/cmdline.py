@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.cmdline
+    ~~~~~~~~~~~~~~~~~~
+
+    Command-line interface for highlighting source files with the
+    cilkhilite lexers and formatters, run as ``python -m cilkhilite``.
+
+    ``-P`` options are given to the lexer and to every formatter.  ``-O``
+    options differ from pygmentize, which gives them to the lexer too:
+    here they are given only to the formatter of the output they follow.
+    latexmkrc relies on this when it rewrites the ``-P`` options of each
+    formatter to ``-O``.  With ``--cache FILE`` the lexed token stream is
+    kept in a token cache (see `cilkhilite.tokencache`), so that changing
+    only ``-O`` options, or the formatter, does not lex the source again.
+
+    Several outputs can be produced from a single lexing pass.  Each
+    ``-f FORMATTER`` starts a new output, and the ``-O`` and ``-o``
+    options that follow it apply to that output::
+
+        python -m cilkhilite -l cilk -P reindent \
+            -f cilkbook -O texcomments -o fib.c-pyg \
+            -f chrtf -O style=cilkbookstyle -o fib.c-rtf fib.c
+
+    Options given before the first ``-f`` apply to a ``cilkbook`` output.
+
+    An output file name containing ``{region}`` produces one output per
+    named region of the source (see `cilkhilite.regions`), with
+    ``{region}`` replaced by the name of the region.  Each region is
+    formatted on its own, starting shown, so that options such as
+    ``reindent`` apply to each excerpt separately::
+
+        python -m cilkhilite -l cilk -P reindent \
+            -f cilkbook -o 'qsort.cpp-{region}-pyg' qsort.cpp
+
+    As the regions may lie in hidden code, the `skiphidden` lexer option
+    is ignored when there is such an output.  ``--region-index FILE``
+    lists the regions and their output files in FILE, as TeX comments.
+
+    Output files whose contents do not change are left untouched, so
+    that latexmk does not see them as changed (see `cilkhilite.output`).
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+from pygments.lexers import get_lexer_by_name, get_lexer_for_filename
+from pygments.formatters import get_formatter_by_name
+from pygments.util import ClassNotFound
+
+from cilkhilite.highlight import format_all, lex
+from cilkhilite.output import StableOutput
+from cilkhilite.regions import split_regions
+
+__all__ = ['main']
+
+PROG = 'cilkhilite'
+
+REGION = '{region}'
+
+
+def parse_opts(options):
+    """Parse pygments options"""
+    opts = {}
+    for option in options:
+        try:
+            name, value = option.split('=', 1)
+        except ValueError:
+            opts[option] = True
+        else:
+            opts[name] = value
+    return opts
+
+
+def _current_output(namespace):
+    if not namespace.outputs:
+        namespace.outputs.append({'formatter': 'cilkbook', 'options': [],
+                                  'outfile': None})
+    return namespace.outputs[-1]
+
+
+class _NewOutput(argparse.Action):
+    """Start a new output using the given formatter."""
+    def __call__(self, parser, namespace, values, option_string=None):
+        namespace.outputs.append({'formatter': values, 'options': [],
+                                  'outfile': None})
+
+
+class _OutputOption(argparse.Action):
+    """Add a formatter option to the current output."""
+    def __call__(self, parser, namespace, values, option_string=None):
+        _current_output(namespace)['options'].append(values)
+
+
+class _OutputFile(argparse.Action):
+    """Set the file name of the current output."""
+    def __call__(self, parser, namespace, values, option_string=None):
+        output = _current_output(namespace)
+        if output['outfile'] is not None:
+            parser.error('-o given twice for formatter "%s"' % output['formatter'])
+        output['outfile'] = values
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m ' + PROG,
+        description='Highlight <source> with Pygments and the cilkhilite plugin.')
+    parser.set_defaults(outputs=[])
+    parser.add_argument('source', metavar='<source>')
+    parser.add_argument('-l', dest='lexer', metavar='LEXER',
+                        help='lexer alias (default: guessed from the file name)')
+    parser.add_argument('-F', dest='filters', action='append', default=[],
+                        metavar='FILTER', help='filter to add to the lexer')
+    parser.add_argument('-P', dest='options', action='append', default=[],
+                        metavar='NAME[=VALUE]',
+                        help='option for the lexer and every formatter')
+    parser.add_argument('-f', action=_NewOutput, metavar='FORMATTER',
+                        help='start a new output using this formatter '
+                        '(default: one cilkbook output)')
+    parser.add_argument('-O', action=_OutputOption, metavar='NAME[=VALUE]',
+                        help='option for the current formatter only')
+    parser.add_argument('-o', action=_OutputFile, metavar='OUTFILE',
+                        help='output file of the current formatter')
+    parser.add_argument('--cache', metavar='FILE',
+                        help='token cache to reuse and update')
+    parser.add_argument('--region-index', metavar='FILE',
+                        help='list the named regions and their outputs '
+                        'in FILE')
+    return parser
+
+
+def write_regions(tokens, outputs, index=None):
+    """Format each named region in <tokens> once for each (formatter,
+    pattern) pair in <outputs>, into the file named by <pattern> with
+    ``{region}`` replaced by the name of the region.  If <index> is
+    given, list the regions and their output files there."""
+    lines = []
+    for name, region_tokens in split_regions(tokens).items():
+        outnames = [pattern.replace(REGION, name) for _, pattern in outputs]
+        for (formatter, _), outname in zip(outputs, outnames):
+            with StableOutput(outname, 'wb') as outfile:
+                formatter.format(region_tokens, outfile)
+        lines.append('%% %s: %s\n' % (name, ' '.join(outnames)))
+    if index is not None:
+        with StableOutput(index, 'w') as f:
+            f.writelines(lines)
+    return len(lines)
+
+
+def main(args=None):
+    parser = make_parser()
+    args = parser.parse_args(args)
+    if not args.outputs:
+        parser.error('no output given')
+    for output in args.outputs:
+        if output['outfile'] is None:
+            parser.error('no -o given for formatter "%s"' % output['formatter'])
+
+    options = parse_opts(args.options)
+    lexer_opts = dict(options)
+    if args.region_index or \
+            any(REGION in output['outfile'] for output in args.outputs):
+        lexer_opts['skiphidden'] = False
+    try:
+        if args.lexer:
+            lexer = get_lexer_by_name(args.lexer, **lexer_opts)
+        else:
+            lexer = get_lexer_for_filename(args.source, **lexer_opts)
+        for filter_name in args.filters:
+            lexer.add_filter(filter_name)
+        formatters = []
+        region_formatters = []
+        for output in args.outputs:
+            fmtr_opts = dict(options)
+            fmtr_opts.update(parse_opts(output['options']))
+            if REGION in output['outfile']:
+                fmtr_opts['hidebydefault'] = False
+            formatter = get_formatter_by_name(output['formatter'], **fmtr_opts)
+            formatter.encoding = formatter.encoding or 'utf-8'
+            if REGION in output['outfile']:
+                region_formatters.append((formatter, output['outfile']))
+            else:
+                formatters.append((formatter, output['outfile']))
+    except (ClassNotFound, ValueError) as err:
+        print('{0}: {1}'.format(PROG, err), file=sys.stderr)
+        return 1
+
+    try:
+        with open(args.source, 'rb') as f:
+            source = f.read()
+    except IOError as err:
+        print('{0}: cannot read "{1}": {2}'.format(PROG, args.source, err),
+              file=sys.stderr)
+        return 1
+
+    tokens = lex(source, lexer, args.cache)
+    outfiles = []
+    try:
+        outputs = []
+        for formatter, outname in formatters:
+            outfile = StableOutput(outname, 'wb')
+            outfiles.append(outfile)
+            outputs.append((formatter, outfile))
+        format_all(tokens, outputs)
+    except BaseException:
+        # Leave the previous outputs in place rather than partial ones.
+        for outfile in outfiles:
+            outfile.discard()
+        raise
+    for outfile in outfiles:
+        outfile.close()
+    if region_formatters or args.region_index:
+        if not write_regions(tokens, region_formatters, args.region_index):
+            print('{0}: no named regions in "{1}"'.format(PROG, args.source),
+                  file=sys.stderr)
+    return 0
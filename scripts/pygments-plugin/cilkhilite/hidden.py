@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.hidden
+    ~~~~~~~~~~~~~~~~~
+
+    Support for the `hidebydefault` formatter option shared by the
+    cilkhilite formatters.
+
+    Besides ``True`` and ``False``, `hidebydefault` accepts ``auto``: the
+    code is hidden by default exactly when the token stream contains a
+    hide/show marker such as ``///>>`` or ``///<<`` (``##>>`` and
+    ``##<<`` in assembly and objdump listings).  The ``Begin``/``End``
+    pair that the lexers emit for ``#line`` macros is not a marker.
+
+    `skip_hidden` lets a lexer with the `skiphidden` option tokenize only
+    the regions that the formatters will show.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+import re
+
+from pygments.token import Token
+from pygments.util import get_bool_opt
+
+__all__ = ['get_hide_opt', 'has_hide_markers', 'resolve_hidebydefault',
+           'skip_hidden']
+
+_marker_re = re.compile(r'\s*(/(\\\n)?/(\\\n)?/|##)\s*(<<|>>)')
+
+# The #line macros and the ///<< and ///>> markers, as matched by the
+# 'whitespace' rules of CilkLexer.  As there, a #line macro takes
+# precedence and swallows the comments, markers included, before it.
+_region_re = re.compile(
+    r'^(?P<line>(?:\s|//.*?\n|/[*].*?[*]/)+#line)(?P<lineno>\s+\d\n)'
+    r'|[ \t\f\v]*/(\\\n)?/(\\\n)?/\s*(?P<kind><<|>>)(\n|(.|\n)*?[^\\]\n)',
+    re.MULTILINE)
+
+
+def get_hide_opt(options, optname='hidebydefault', default=False):
+    """Like `get_bool_opt`, but also accepts the string ``'auto'``."""
+    value = options.get(optname, default)
+    if str(value).lower() == 'auto':
+        return 'auto'
+    return get_bool_opt(options, optname, default)
+
+
+def has_hide_markers(tokens):
+    """Return True if <tokens> contains a hide or show marker."""
+    for ttype, value in tokens:
+        if ttype in Token.Comment.Invisible.Begin or \
+                ttype in Token.Comment.Invisible.End:
+            if _marker_re.match(value):
+                return True
+    return False
+
+
+def resolve_hidebydefault(hidebydefault, tokensource):
+    """Return a (hide, tokens) pair for formatting <tokensource>.
+
+    If <hidebydefault> is ``'auto'``, the token stream is buffered in a
+    list and scanned for markers.  Otherwise <tokensource> is returned
+    untouched."""
+    if hidebydefault != 'auto':
+        return hidebydefault, tokensource
+    if not isinstance(tokensource, list):
+        tokensource = list(tokensource)
+    return has_hide_markers(tokensource), tokensource
+
+
+def skip_hidden(text, hide, lex_visible, scan_hidden=None):
+    """Yield the (index, tokentype, value) triples of <text>, lexing only
+    the regions that are shown when the code starts hidden (if <hide>)
+    or shown.
+
+    The ``///>>`` and ``///<<`` markers are found by a plain text search
+    and yielded as ``Comment.Invisible.Begin`` and ``End`` tokens.  Each
+    hidden region is yielded as one ``Comment.Invisible.Hidden`` token,
+    after passing it to <scan_hidden>, if given.  Each shown region is
+    lexed on its own by <lex_visible>, starting from the root state, so
+    a construct that spans a hidden region may be colored differently
+    than when the whole text is lexed.  If <hide> is ``'auto'``, the code
+    starts hidden when <text> contains a marker."""
+    if hide == 'auto':
+        hide = any(match.group('kind') for match in _region_re.finditer(text))
+    pos = 0
+    for match in _region_re.finditer(text):
+        start = match.start()
+        if match.group('line'):
+            # The Begin/End pair of a #line macro shows hidden code.
+            if not hide:
+                continue
+            tokens = [(start, Token.Comment.Invisible.Begin,
+                       match.group('line')),
+                      (match.start('lineno'), Token.Comment.Invisible.End,
+                       match.group('lineno'))]
+        elif match.group('kind') == '>>':
+            tokens = [(start, Token.Comment.Invisible.Begin, match.group())]
+        else:
+            tokens = [(start, Token.Comment.Invisible.End, match.group())]
+        for token in _region_tokens(text, pos, start, hide, lex_visible,
+                                    scan_hidden):
+            yield token
+        for token in tokens:
+            yield token
+        hide = tokens[-1][1] is Token.Comment.Invisible.Begin
+        pos = match.end()
+    for token in _region_tokens(text, pos, len(text), hide, lex_visible,
+                                scan_hidden):
+        yield token
+
+
+def _region_tokens(text, start, end, hide, lex_visible, scan_hidden):
+    if start == end:
+        return
+    region = text[start:end]
+    if hide:
+        if scan_hidden is not None:
+            scan_hidden(region)
+        yield start, Token.Comment.Invisible.Hidden, region
+        return
+    for index, ttype, value in lex_visible(region):
+        yield start + index, ttype, value
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.highlight
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Highlighting helpers that lex a source once and format the resulting
+    token stream with several formatters, and that highlight many sources
+    on a thread pool.
+
+    The cilkhilite lexers and formatters keep no per-call state on the
+    instance or the class, so one lexer or formatter may be used by
+    several threads at once.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from multiprocessing.pool import ThreadPool
+
+from pygments import highlight
+
+from cilkhilite import trace
+from cilkhilite.profiling import profiled
+from cilkhilite.tokencache import cached_tokens
+
+__all__ = ['lex', 'format_all', 'highlight_outputs', 'highlight_many']
+
+
+@profiled
+def lex(code, lexer, cache=None):
+    """Lex <code> with <lexer> and return the token stream as a list.
+
+    If <cache> is the path of a token cache, the cached tokens are used
+    when they were produced by the same lexer configuration from the
+    same code (see `cilkhilite.tokencache.cached_tokens`)."""
+    with trace.span('lex', 'phase'):
+        if cache:
+            return cached_tokens(lexer, code, cache)
+        return list(lexer.get_tokens(code))
+
+
+def format_all(tokens, outputs):
+    """Format the token list <tokens> once for each (formatter, outfile)
+    pair in <outputs>."""
+    for formatter, outfile in outputs:
+        with trace.span('format', 'phase',
+                        formatter=type(formatter).__name__):
+            formatter.format(tokens, outfile)
+
+
+def highlight_outputs(code, lexer, outputs, cache=None):
+    """Lex <code> once with <lexer> and write it to each (formatter,
+    outfile) pair in <outputs>.
+
+    This is the multi-output counterpart of `pygments.highlight`:
+    producing LaTeX and RTF versions of a listing costs one lexing pass
+    instead of two."""
+    format_all(lex(code, lexer, cache), outputs)
+
+
+def _highlight_job(job):
+    code, lexer, formatter = job
+    with trace.span('highlight', 'job', chars=len(code)):
+        return highlight(code, lexer, formatter)
+
+
+def highlight_many(jobs, processes=None):
+    """Highlight each (code, lexer, formatter) triple in <jobs> on a pool
+    of <processes> threads (default: one per CPU) and return the list of
+    results, in the order of <jobs>.
+
+    Lexers and formatters may be shared between jobs.  On CPython with
+    the GIL the threads mostly take turns; on a free-threaded build the
+    regex matching of different jobs runs in parallel."""
+    jobs = list(jobs)
+    if processes == 1 or len(jobs) < 2:
+        return [_highlight_job(job) for job in jobs]
+    pool = ThreadPool(processes)
+    try:
+        return pool.map(_highlight_job, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
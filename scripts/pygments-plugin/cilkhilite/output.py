@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.output
+    ~~~~~~~~~~~~~~~~~
+
+    Output files that keep their time stamp when their contents do not
+    change.
+
+    latexmk runs LaTeX again when a file read by the document changes,
+    and an output rewritten with the same contents looks changed to it.
+    A `StableOutput` is written to a temporary file of a unique name next
+    to its target, so that several writers of the same target, e.g. the
+    watcher and latexmk, do not write to the same file.  When it is
+    closed, the temporary file replaces the target only if
+    their contents differ, as found by comparing their sizes and then
+    their digests, computed block by block.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+import hashlib
+import os
+import tempfile
+
+__all__ = ['file_digest', 'same_contents', 'replace_if_changed',
+           'StableOutput']
+
+BLOCK_SIZE = 1 << 16
+
+# Permissions of the outputs, as for files created by `open`, rather
+# than the 0600 of the files created by `tempfile.mkstemp`.
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+
+def file_digest(path, blocksize=BLOCK_SIZE):
+    """Return the SHA-1 hex digest of the file at <path>, read in blocks
+    of <blocksize> bytes."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        block = f.read(blocksize)
+        while block:
+            h.update(block)
+            block = f.read(blocksize)
+    return h.hexdigest()
+
+
+def same_contents(path, other):
+    """Return True if the files at <path> and <other> exist and have the
+    same contents."""
+    try:
+        if os.path.getsize(path) != os.path.getsize(other):
+            return False
+        return file_digest(path) == file_digest(other)
+    except (IOError, OSError):
+        return False
+
+
+def replace_if_changed(src, dst):
+    """Move the file <src> to <dst>, unless <dst> has the same contents,
+    in which case <src> is removed and <dst> is left untouched.  Return
+    True if <dst> was replaced."""
+    if same_contents(src, dst):
+        os.remove(src)
+        return False
+    os.replace(src, dst)
+    return True
+
+
+class StableOutput(object):
+    """A file opened for writing at <path> with <mode> and <kwargs> as
+    for `open`, which replaces the file at <path> on `close` only if
+    the contents changed.  The `changed` attribute tells whether it
+    did.
+
+    Used as a context manager, the output is discarded if the block
+    raises an exception, leaving the file at <path> untouched."""
+
+    def __init__(self, path, mode='w', **kwargs):
+        self.path = path
+        fd, self.tmppath = tempfile.mkstemp(
+            prefix=os.path.basename(path) + '.', suffix='.tmp',
+            dir=os.path.dirname(path) or '.')
+        try:
+            os.chmod(self.tmppath, FILE_MODE)
+            self.file = os.fdopen(fd, mode, **kwargs)
+        except BaseException:
+            os.close(fd)
+            os.remove(self.tmppath)
+            raise
+        self.changed = None
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+    def write(self, s):
+        return self.file.write(s)
+
+    def writelines(self, lines):
+        self.file.writelines(lines)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        self.changed = replace_if_changed(self.tmppath, self.path)
+
+    def discard(self):
+        """Close the output without touching the file at <path>."""
+        if self.file.closed:
+            return
+        self.file.close()
+        os.remove(self.tmppath)
+        self.changed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.plan
+    ~~~~~~~~~~~~~~~
+
+    Build planner, which finds the highlighted files that a document
+    reads before LaTeX does::
+
+        python -m cilkhilite.plan [--build] [--hashes FILE] book.tex
+
+    latexmk learns that a code figure needs ``fib.c-pyg`` only when
+    ``\\input`` fails inside ``\\codepage``, so a clean build takes extra
+    LaTeX passes to discover the highlighted files.  The planner reads
+    the ``.tex`` files instead, following ``\\input``, ``\\include`` and
+    the local packages loaded with ``\\usepackage``, and collects the
+    arguments of the code-figure macros of ``fccode.sty`` (``\\codefig``,
+    ``\\ccodefig``, ``\\cppcodefig``, ``\\javacodefig``, ``\\pycodefig``,
+    ``\\llcodefig``, ``\\consolecodefig``, ``\\codefiglines`` and the
+    region variants).  File names are resolved like TeX does, relative
+    to the current directory.
+
+    An output is stale if it is missing or older than its source.  With
+    ``--hashes FILE``, the SHA-1 digest of each source is recorded in
+    FILE, and a source whose digest is recorded is stale exactly when its
+    digest changed, whatever the time stamps say.  The stale outputs are
+    listed one per line, or highlighted as latexmkrc does with
+    ``--build`` (see `cilkhilite.rules`), so that the first LaTeX pass
+    finds all of them.
+
+    The code of the ``codehilite`` environments, including those defined
+    with ``\\newcodehilite`` and ``\\newcodehiliteOut``, is in the
+    ``.tex`` files themselves and reaches pyginpar through LaTeX, so it
+    cannot be highlighted before the first pass.  With ``-v``, the
+    planner counts these blocks and tells whether pyginpar will have to
+    run after that pass.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import re
+import sys
+from collections import namedtuple
+
+from cilkhilite import cmdline, rules
+from cilkhilite.output import StableOutput, file_digest
+
+__all__ = ['Reference', 'CODEFIG_MACROS', 'Scanner', 'Planner', 'main']
+
+PROG = 'cilkhilite.plan'
+
+# A highlighted file read by the document: the -pyg output of <source>
+# if <region> is None, and the output of that named region otherwise.
+Reference = namedtuple('Reference', 'source region texfile line')
+
+# The code-figure macros of fccode.sty, mapped to the extension added
+# to their file argument (None if the argument is the file name) and
+# to whether they show a named region.
+CODEFIG_MACROS = {
+    'codefig': (None, False),
+    'codefiglines': (None, False),
+    'ccodefig': ('c', False),
+    'cppcodefig': ('cpp', False),
+    'javacodefig': ('java', False),
+    'pycodefig': ('py', False),
+    'llcodefig': ('ll', False),
+    'consolecodefig': ('sh-session', False),
+    'regioncodefig': (None, True),
+    'cregioncodefig': ('c', True),
+    'cppregioncodefig': ('cpp', True),
+}
+
+# Environments whose contents are highlighted by pyginpar.
+CODEHILITE_ENVIRONMENTS = ('codehilite', 'codehiliteOut')
+
+_macro_re = re.compile(r'\\([a-zA-Z@]+)\s*')
+_comment_re = re.compile(r'(?<!\\)%.*')
+_begin_re = re.compile(r'\\begin\s*\{([^{}]+)\}')
+
+
+def _strip_comments(text):
+    return '\n'.join(_comment_re.sub('', line) for line in text.split('\n'))
+
+
+def _group(text, pos, open_char, close_char):
+    """Return the (contents, end) pair of the group starting at <pos>
+    with <open_char>, or (None, pos) if there is none."""
+    while pos < len(text) and text[pos] in ' \t\n':
+        pos += 1
+    if pos >= len(text) or text[pos] != open_char:
+        return None, pos
+    depth = 0
+    for end in range(pos, len(text)):
+        if text[end] == open_char:
+            depth += 1
+        elif text[end] == close_char:
+            depth -= 1
+            if depth == 0:
+                return text[pos + 1:end], end + 1
+    return None, pos
+
+
+def _arguments(text, pos, count):
+    """Return the optional argument and the list of <count> mandatory
+    arguments of the macro whose name ends at <pos>, or None if they are
+    not all there."""
+    optional, pos = _group(text, pos, '[', ']')
+    args = []
+    for _ in range(count):
+        arg, pos = _group(text, pos, '{', '}')
+        if arg is None:
+            return optional, None
+        args.append(arg.strip())
+    return optional, args
+
+
+class Scanner(object):
+    """Collects the code figures and codehilite environments of a
+    document, starting from one or more .tex files."""
+
+    def __init__(self):
+        self.references = []
+        self.files = []
+        self.environments = set(CODEHILITE_ENVIRONMENTS)
+        # Bodies of \newenvironment definitions, by environment name
+        self.definitions = {}
+        # Number of blocks of each environment, by .tex file
+        self.blocks = {}
+        self._seen = set()
+
+    def scan(self, path):
+        """Scan the file <path> and the files that it reads."""
+        if path in self._seen or not os.path.isfile(path):
+            return
+        self._seen.add(path)
+        self.files.append(path)
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                text = _strip_comments(f.read())
+        except (IOError, OSError) as err:
+            print('{0}: cannot read "{1}": {2}'.format(PROG, path, err),
+                  file=sys.stderr)
+            return
+
+        blocks = self.blocks.setdefault(path, {})
+        for match in _begin_re.finditer(text):
+            name = match.group(1).strip()
+            blocks[name] = blocks.get(name, 0) + 1
+
+        for match in _macro_re.finditer(text):
+            name = match.group(1)
+            pos = match.end()
+            if name in CODEFIG_MACROS:
+                self._codefig(path, text, match.start(), pos, name)
+            elif name in ('input', 'include', 'subfile'):
+                _, args = _arguments(text, pos, 1)
+                if args and '#' not in args[0]:
+                    self.scan(self._tex_file(args[0]))
+            elif name in ('usepackage', 'RequirePackage'):
+                _, args = _arguments(text, pos, 1)
+                for package in (args[0].split(',') if args else []):
+                    self.scan(package.strip() + '.sty')
+            elif name in ('newcodehilite', 'newcodehiliteOut'):
+                optional, args = _arguments(text, pos, 1)
+                if args is not None:
+                    self.environments.add(optional or args[0] + 'code')
+            elif name == 'newenvironment':
+                _, args = _arguments(text, pos, 1)
+                if args is not None:
+                    end = text.find('\n\n', pos)
+                    body = text[pos:end if end >= 0 else len(text)]
+                    self.definitions[args[0]] = \
+                        set(m.group(1).strip() for m in _begin_re.finditer(body))
+
+    def _tex_file(self, name):
+        if os.path.splitext(name)[1]:
+            return name
+        return name + '.tex'
+
+    def _codefig(self, path, text, start, pos, name):
+        ext, region = CODEFIG_MACROS[name]
+        count = {'codefiglines': 3}.get(name, 2 if region else 1)
+        _, args = _arguments(text, pos, count)
+        if not args or any('#' in arg for arg in args):
+            # A macro definition, not a figure
+            return
+        source = args[0] + '.' + ext if ext else args[0]
+        line = text.count('\n', 0, start) + 1
+        self.references.append(
+            Reference(source, args[1] if region else None, path, line))
+
+    def code_environments(self):
+        """Return the set of environments whose contents are highlighted
+        by pyginpar, including those defined in terms of others."""
+        environments = set(self.environments)
+        changed = True
+        while changed:
+            changed = False
+            for name, uses in self.definitions.items():
+                if name not in environments and uses & environments:
+                    environments.add(name)
+                    changed = True
+        return environments
+
+    def code_blocks(self):
+        """Return a dict mapping each .tex file to its number of blocks
+        of code environments."""
+        environments = self.code_environments()
+        result = {}
+        for path, blocks in self.blocks.items():
+            count = sum(n for name, n in blocks.items()
+                        if name in environments and not path.endswith('.sty'))
+            if count:
+                result[path] = count
+        return result
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class Planner(object):
+    """Decides which highlighted files of the references found by a
+    `Scanner` are stale.  If <hashes> is a dict, it maps sources to their
+    recorded digests, and is updated with the digests of the sources
+    whose outputs are current."""
+
+    def __init__(self, rtf=False, hashes=None):
+        self.rtf = rtf
+        self.hashes = hashes
+        self._digests = {}
+
+    def digest(self, source):
+        if source not in self._digests:
+            self._digests[source] = file_digest(source)
+        return self._digests[source]
+
+    def outputs(self, reference):
+        """Return the list of the files that <reference> needs."""
+        base, rule = rules.source_rule(reference.source)
+        if reference.region is None:
+            return rules.outputs(reference.source, self.rtf, regions=False)
+        return [base + '.' + rule.regionsext,
+                '{0}-{1}-pyg'.format(reference.source, reference.region)]
+
+    def is_stale(self, reference):
+        outputs = self.outputs(reference)
+        if any(not os.path.exists(output) for output in outputs):
+            return True
+        if self.hashes is not None and reference.source in self.hashes:
+            return self.hashes[reference.source] != \
+                self.digest(reference.source)
+        mtime = _mtime(reference.source)
+        return any(_mtime(output) < mtime for output in outputs)
+
+    def plan(self, references):
+        """Return the list of (source, region, outputs) triples for the
+        stale outputs of <references>, where region is True if the named
+        regions of source are needed.  A source appears once for its
+        -pyg output and once for its regions.  References to missing
+        sources or to files without a rule are reported and skipped."""
+        stale = []
+        current = []
+        seen = set()
+        for reference in references:
+            key = (reference.source, reference.region is not None)
+            if key in seen:
+                continue
+            seen.add(key)
+            base, rule = rules.source_rule(reference.source)
+            if rule is None:
+                problem = 'no rule for this file type'
+            elif not os.path.isfile(reference.source):
+                problem = 'source not found'
+            elif reference.region is not None and not rule.regionsext:
+                problem = 'no named regions for this file type'
+            else:
+                problem = None
+            if problem:
+                print('{0}:{1}: {2}: {3}'.format(reference.texfile,
+                                                 reference.line,
+                                                 reference.source, problem),
+                      file=sys.stderr)
+            elif self.is_stale(reference):
+                stale.append((reference.source, key[1],
+                              self.outputs(reference)))
+            else:
+                current.append(reference.source)
+        stale_sources = set(source for source, _, _ in stale)
+        for source in current:
+            if source not in stale_sources:
+                self.record(source)
+        return stale
+
+    def record(self, source):
+        if self.hashes is not None:
+            self.hashes[source] = self.digest(source)
+
+
+def build(planner, stale, verbose=False):
+    """Highlight the stale outputs in <stale>, as returned by
+    `Planner.plan`.  Return the number of failures."""
+    failures = 0
+    for source, region, outputs in stale:
+        ok = True
+        for args in rules.commands(source, planner.rtf, regions=region,
+                                   pyg=not region):
+            try:
+                ok = cmdline.main(args) == 0 and ok
+            except Exception as err:
+                print('{0}: error highlighting "{1}": {2}'.format(
+                    PROG, source, err), file=sys.stderr)
+                ok = False
+        for output in outputs:
+            if ok and not os.path.exists(output):
+                print('{0}: "{1}" was not produced'.format(PROG, output),
+                      file=sys.stderr)
+                ok = False
+        if ok:
+            planner.record(source)
+            if verbose:
+                print('{0}: highlighted {1}{2}'.format(
+                    PROG, source, ' (regions)' if region else ''))
+        else:
+            failures += 1
+    return failures
+
+
+def load_hashes(path):
+    try:
+        with open(path, 'r') as f:
+            hashes = json.load(f)
+        if isinstance(hashes, dict):
+            return hashes
+    except (IOError, OSError, ValueError):
+        pass
+    return {}
+
+
+def save_hashes(path, hashes):
+    with StableOutput(path) as f:
+        json.dump(hashes, f, indent=0, sort_keys=True)
+        f.write('\n')
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m ' + PROG,
+        description='List or build the stale highlighted files read by '
+        'the code figures of <tex_file>.')
+    parser.add_argument('texfiles', metavar='<tex_file>', nargs='+')
+    parser.add_argument('--build', action='store_true',
+                        help='highlight the stale files as latexmkrc does')
+    parser.add_argument('--rtf', action='store_true',
+                        help='also consider the RTF outputs, as with '
+                        '$PRODUCE_RTF in latexmkrc')
+    parser.add_argument('--hashes', metavar='FILE',
+                        help='compare the sources with the digests recorded '
+                        'in FILE instead of the time stamps of the outputs, '
+                        'and update FILE')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    return parser
+
+
+def main(args=None):
+    args = make_parser().parse_args(args)
+
+    scanner = Scanner()
+    for path in args.texfiles:
+        scanner.scan(path)
+    hashes = load_hashes(args.hashes) if args.hashes else None
+    planner = Planner(args.rtf, hashes)
+    stale = planner.plan(scanner.references)
+
+    if args.verbose:
+        print('{0}: {1} files, {2} code figures, {3} stale'.format(
+            PROG, len(scanner.files), len(scanner.references), len(stale)))
+        blocks = scanner.code_blocks()
+        if blocks:
+            jobname = os.path.splitext(os.path.basename(args.texfiles[0]))[0]
+            ipcode = jobname + '-ipcode.sty'
+            mtime = _mtime(ipcode)
+            pending = mtime is None or \
+                any(_mtime(path) > mtime for path in blocks)
+            print('{0}: {1} in-paragraph code blocks; {2}'.format(
+                PROG, sum(blocks.values()),
+                'pyginpar runs after the first pass' if pending
+                else '{0} is current'.format(ipcode)))
+
+    status = 0
+    if args.build:
+        status = 1 if build(planner, stale, args.verbose) else 0
+    else:
+        for _, _, outputs in stale:
+            for output in outputs:
+                print(output)
+    if hashes is not None:
+        save_hashes(args.hashes, hashes)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
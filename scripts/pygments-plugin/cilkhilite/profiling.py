@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.profiling
+    ~~~~~~~~~~~~~~~~~~~~
+
+    cProfile support for the highlighting scripts and the plugin, scoped
+    to the lexing, formatting and output phases, so that the profile is
+    not dominated by interpreter startup, imports and option parsing.
+
+    Profiling is opt-in.  `start` creates the process-wide `Profiler`,
+    which writes its statistics to a ``.pstats`` file when the process
+    exits; ``{pid}`` in the file name is replaced by the process ID, for
+    runs that start many processes.  `scope` returns a context manager
+    that profiles its block while a profiler is active, and does nothing
+    otherwise.  ``pyginline`` and ``pyginpar`` start a profiler with
+    ``--profile OUT.pstats``.
+
+    If the environment variable ``CILKHILITE_PROFILE`` is set, the
+    profiler is started when this module is imported, and the
+    ``format_unencoded`` method of the cilkhilite formatters is profiled,
+    which covers lexing too, as Pygments passes them a lazy token stream.
+    This profiles the pygmentize runs that codehilite.sty launches
+    through ``\\write18``::
+
+        CILKHILITE_PROFILE=/tmp/cilkhilite-{pid}.pstats pdflatex -shell-escape book
+
+    The profiler modules are only imported when profiling, so that the
+    plugin starts as fast without it.
+
+    Usage from the command line, to profile highlighting one file::
+
+        python -m cilkhilite.profiling [-l cilk] [-f cilkbook] [-o OUT.pstats] file.c
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import atexit
+import functools
+import os
+import sys
+import time
+from contextlib import nullcontext
+from io import StringIO
+
+__all__ = ['ENV_VAR', 'Profiler', 'start', 'active', 'scope', 'profiled',
+           'main']
+
+ENV_VAR = 'CILKHILITE_PROFILE'
+
+timer = getattr(time, 'perf_counter', time.time)
+
+_profiler = None
+
+
+class Profiler(object):
+    """A cProfile profiler that is enabled in the blocks that use it as a
+    context manager, and writes its statistics to <path>.  The blocks
+    may be nested."""
+
+    def __init__(self, path=None):
+        import cProfile
+        self.path = path
+        self.profile = cProfile.Profile()
+        self.depth = 0
+
+    def __enter__(self):
+        self.depth += 1
+        if self.depth == 1:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            self.profile.disable()
+
+    def dump(self, path=None):
+        """Write the statistics to <path> (default: the path given to the
+        profiler), with ``{pid}`` replaced by the process ID."""
+        path = path or self.path
+        if path:
+            self.profile.dump_stats(path.replace('{pid}', str(os.getpid())))
+
+    def print_stats(self, outfile=sys.stdout, sort='cumulative', limit=30):
+        import pstats
+        stats = pstats.Stats(self.profile, stream=outfile)
+        stats.sort_stats(sort).print_stats(limit or None)
+
+
+def start(path):
+    """Start the process-wide profiler, writing to <path> at exit, and
+    return it.  If a profiler is active already, its output goes to
+    <path> instead."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(path)
+        atexit.register(_dump)
+    else:
+        _profiler.path = path
+    return _profiler
+
+
+def _dump():
+    if _profiler is not None:
+        _profiler.dump()
+
+
+def active():
+    """Return the process-wide profiler, or None if there is none."""
+    return _profiler
+
+
+def scope():
+    """Return a context manager that profiles its block if a profiler is
+    active."""
+    if _profiler is None:
+        return nullcontext()
+    return _profiler
+
+
+def profiled(func):
+    """Decorator profiling <func> if ``CILKHILITE_PROFILE`` was set when
+    this module was imported.  Otherwise, return <func> itself."""
+    if _profiler is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _profiler:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+if os.environ.get(ENV_VAR):
+    start(os.environ[ENV_VAR])
+
+
+def _parse_opts(options):
+    opts = {}
+    for option in options:
+        name, _, value = option.partition('=')
+        opts[name] = value or True
+    return opts
+
+
+def main(args=None):
+    import argparse
+    from pygments.formatters import get_formatter_by_name
+    from pygments.lexers import get_lexer_by_name, get_lexer_for_filename
+
+    parser = argparse.ArgumentParser(
+        prog='python -m cilkhilite.profiling',
+        description='Highlight <file> under cProfile, profiling only the '
+        'lexing, formatting and output phases.')
+    parser.add_argument('file')
+    parser.add_argument('-l', dest='lexer', metavar='LEXER',
+                        help='lexer alias (default: guessed from the file name)')
+    parser.add_argument('-f', dest='formatter', metavar='FORMATTER',
+                        default='cilkbook',
+                        help='formatter alias (default: cilkbook)')
+    parser.add_argument('-P', dest='options', action='append', default=[],
+                        metavar='NAME[=VALUE]',
+                        help='option for the lexer and the formatter')
+    parser.add_argument('-O', dest='formatter_options', action='append',
+                        default=[], metavar='NAME[=VALUE]',
+                        help='option for the formatter only')
+    parser.add_argument('-o', dest='output', metavar='OUT.pstats',
+                        help='write the profile to OUT.pstats')
+    parser.add_argument('-w', dest='outfile', metavar='OUTFILE',
+                        default=os.devnull,
+                        help='write the highlighted file to OUTFILE '
+                        '(default: discard it)')
+    parser.add_argument('-n', dest='limit', type=int, default=30,
+                        help='number of functions to report (default: 30, '
+                        '0 for all)')
+    parser.add_argument('--sort', default='cumulative',
+                        help='pstats sort key (default: cumulative)')
+    args = parser.parse_args(args)
+
+    options = _parse_opts(args.options)
+    fmtr_opts = dict(options)
+    fmtr_opts.update(_parse_opts(args.formatter_options))
+    if args.lexer:
+        lexer = get_lexer_by_name(args.lexer, **options)
+    else:
+        lexer = get_lexer_for_filename(args.file, **options)
+    formatter = get_formatter_by_name(args.formatter, **fmtr_opts)
+    with open(args.file, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    profiler = _profiler or Profiler()
+    profiler.path = args.output or profiler.path
+    times = []
+    start_time = timer()
+    with profiler:
+        tokens = list(lexer.get_tokens(text))
+    times.append(('lex', timer() - start_time))
+    start_time = timer()
+    with profiler:
+        output = StringIO()
+        formatter.format(tokens, output)
+    times.append(('format', timer() - start_time))
+    start_time = timer()
+    with profiler:
+        with open(args.outfile, 'w', encoding='utf-8') as f:
+            f.write(output.getvalue())
+    times.append(('write', timer() - start_time))
+
+    sys.stdout.write('%d tokens; %s (including profiling overhead)\n\n' % (
+        len(tokens),
+        ', '.join('%s %.3f s' % (phase, seconds) for phase, seconds in times)))
+    profiler.print_stats(sys.stdout, args.sort, args.limit)
+    profiler.dump()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
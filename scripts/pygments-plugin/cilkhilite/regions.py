@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.regions
+    ~~~~~~~~~~~~~~~~~~
+
+    Named regions, for showing several excerpts of one source file in
+    different figures.
+
+    A hide/show marker may name a region: ``///<< name`` starts the
+    region ``name`` and ``///>> name`` ends it (``##<< name`` and
+    ``##>> name`` in assembly and objdump listings).  A region may
+    consist of several such pieces, and regions may overlap.  Formatted
+    as a whole, a source with named regions shows the union of its
+    regions, as the markers are ordinary hide/show markers.
+
+    `split_regions` cuts a token stream into the token streams of its
+    regions, so that a source is lexed once for all of its excerpts.
+    Inside a region, unnamed markers keep hiding parts of the excerpt,
+    while the markers of the other regions are dropped.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+import re
+
+from pygments.token import Token
+
+__all__ = ['marker_lines', 'split_regions']
+
+_marker_line_re = re.compile(
+    r'\s*(?:/(?:\\\n)?/(?:\\\n)?/|##)\s*(<<|>>)[ \t]*([\w-]*)[^\n]*(\n|$)')
+
+
+def marker_lines(ttype, value):
+    """Return the list of (kind, name, text) triples of the hide/show
+    markers that make up the token (<ttype>, <value>), where kind is
+    ``'<<'`` or ``'>>'`` and name is empty for an unnamed marker.
+
+    A token may hold several markers, e.g. after the ``tokenmerge``
+    filter.  Return an empty list if the token is not made of markers."""
+    if ttype not in Token.Comment.Invisible.Begin and \
+            ttype not in Token.Comment.Invisible.End:
+        return []
+    lines = []
+    pos = 0
+    while pos < len(value):
+        match = _marker_line_re.match(value, pos)
+        if match is None or match.end() == pos:
+            return []
+        lines.append((match.group(1), match.group(2), match.group()))
+        pos = match.end()
+    return lines
+
+
+def split_regions(tokens):
+    """Return a dict mapping the name of each region in the token stream
+    <tokens> to the list of its tokens, in the order in which the regions
+    start.  The tokens of a region begin shown."""
+    regions = {}
+    current = []
+    for ttype, value in tokens:
+        lines = marker_lines(ttype, value)
+        if not any(name for _, name, _ in lines):
+            for name in current:
+                regions[name].append((ttype, value))
+            continue
+        for kind, name, text in lines:
+            if not name:
+                if kind == '<<':
+                    marker = (Token.Comment.Invisible.End, text)
+                else:
+                    marker = (Token.Comment.Invisible.Begin, text)
+                for region in current:
+                    regions[region].append(marker)
+            elif kind == '<<':
+                if name not in current:
+                    current.append(name)
+                regions.setdefault(name, [])
+            elif name in current:
+                current.remove(name)
+    return regions
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.ruleprof
+    ~~~~~~~~~~~~~~~~~~~
+
+    Per-rule regex timing for RegexLexer-based lexers such as CilkLexer.
+
+    Profiling is opt-in: `RuleProfile.instrument` replaces the compiled
+    rule table of one lexer *instance* with wrapped copies that record,
+    for every (state, rule index), the number of match attempts, the
+    number of successful matches and the total and maximum time spent.
+    Lexers that are not instrumented run the unmodified class-level
+    table and pay no overhead.
+
+    Usage from the command line::
+
+        python -m cilkhilite.ruleprof [-l cilk] [-n 30] file.c
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+__all__ = ['RuleProfile']
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class RuleProfile(object):
+    """
+    Collects per-rule statistics for instrumented lexers.
+
+    `stats` maps (lexer name, state, rule index) to a list
+    ``[calls, matches, total seconds, max seconds, pattern]``.
+    """
+
+    SORT_KEYS = {
+        'total': lambda item: item[1][2],
+        'max': lambda item: item[1][3],
+        'calls': lambda item: item[1][0],
+        'matches': lambda item: item[1][1],
+    }
+
+    def __init__(self):
+        self.stats = {}
+
+    def _wrap(self, rexmatch, record):
+        def match(text, pos=0):
+            start = timer()
+            m = rexmatch(text, pos)
+            elapsed = timer() - start
+            record[0] += 1
+            if m:
+                record[1] += 1
+            record[2] += elapsed
+            if elapsed > record[3]:
+                record[3] = elapsed
+            return m
+        return match
+
+    def instrument(self, lexer):
+        """Instrument every rule of <lexer>, and of the lexers it
+        delegates to, and return <lexer>."""
+        # DelegatingLexer keeps its two lexers as attributes.
+        for attr in ('root_lexer', 'language_lexer'):
+            sublexer = getattr(lexer, attr, None)
+            if sublexer is not None:
+                self.instrument(sublexer)
+
+        tokendefs = getattr(lexer, '_tokens', None)
+        if tokendefs is None:
+            return lexer
+
+        name = lexer.__class__.__name__
+        instrumented = {}
+        for state, rules in tokendefs.items():
+            wrapped = []
+            for index, (rexmatch, action, new_state) in enumerate(rules):
+                record = self.stats.setdefault(
+                    (name, state, index),
+                    [0, 0, 0.0, 0.0, getattr(rexmatch, '__self__', None)])
+                wrapped.append((self._wrap(rexmatch, record), action, new_state))
+            instrumented[state] = wrapped
+        # RegexLexer.get_tokens_unprocessed looks the table up through
+        # the instance, so this shadows the class attribute for this
+        # lexer only.
+        lexer._tokens = instrumented
+        return lexer
+
+    def report(self, outfile=sys.stdout, sort='total', limit=None):
+        """Write a table of the collected statistics to <outfile>, sorted
+        by <sort> (``'total'``, ``'max'``, ``'calls'`` or ``'matches'``)
+        in decreasing order."""
+        items = [item for item in self.stats.items() if item[1][0]]
+        items.sort(key=self.SORT_KEYS[sort], reverse=True)
+        if limit:
+            items = items[:limit]
+
+        outfile.write('%-14s %-24s %5s %9s %9s %10s %10s  %s\n' %
+                      ('lexer', 'state', 'rule', 'calls', 'matches',
+                       'total ms', 'max us', 'pattern'))
+        for (name, state, index), (calls, matches, total, peak, rex) in items:
+            pattern = rex.pattern if rex is not None else '?'
+            if len(pattern) > 60:
+                pattern = pattern[:57] + '...'
+            outfile.write('%-14s %-24s %5d %9d %9d %10.3f %10.1f  %s\n' %
+                          (name[:14], state[:24], index, calls, matches,
+                           total * 1e3, peak * 1e6, pattern))
+
+
+def main(args=None):
+    from pygments.lexers import get_lexer_by_name
+    from cilkhilite.cilklexer import CilkLexer
+
+    parser = argparse.ArgumentParser(
+        prog='python -m cilkhilite.ruleprof',
+        description='Lex <file> and report the time spent in each lexer rule.')
+    parser.add_argument('file', type=argparse.FileType('r'))
+    parser.add_argument('-l', dest='lexer', default=None,
+                        help='lexer alias (default: the Cilk lexer)')
+    parser.add_argument('-P', dest='options', action='append', default=[],
+                        metavar='NAME=VALUE', help='lexer option')
+    parser.add_argument('-n', dest='limit', type=int, default=40,
+                        help='number of rules to report (default: 40, 0 for all)')
+    parser.add_argument('--sort', choices=sorted(RuleProfile.SORT_KEYS),
+                        default='total', help='sort key (default: total)')
+    args = parser.parse_args(args)
+
+    options = {}
+    for option in args.options:
+        name, _, value = option.partition('=')
+        options[name] = value or True
+
+    if args.lexer:
+        lexer = get_lexer_by_name(args.lexer, **options)
+    else:
+        lexer = CilkLexer(**options)
+
+    profile = RuleProfile()
+    profile.instrument(lexer)
+    text = args.file.read()
+    args.file.close()
+
+    start = timer()
+    ntokens = 0
+    for _ in lexer.get_tokens(text):
+        ntokens += 1
+    elapsed = timer() - start
+
+    sys.stdout.write('%d tokens in %.3f s (including profiling overhead)\n\n'
+                     % (ntokens, elapsed))
+    profile.report(sys.stdout, sort=args.sort, limit=args.limit)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
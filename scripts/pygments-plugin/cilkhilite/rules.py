@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.rules
+    ~~~~~~~~~~~~~~~~
+
+    The highlighting rules of ``latexmkrc``, for the tools that
+    highlight sources outside of latexmk.
+
+    Each rule maps the extension of a source, such as ``c`` for
+    ``fib.c``, to the lexer and the options that latexmkrc uses for it
+    and to the extension of its output, ``fib.c-pyg``.  `commands`
+    returns the `cilkhilite.cmdline` arguments that produce the outputs
+    of a source the way latexmkrc does, so that they can be run with
+    `cilkhilite.cmdline.main`.
+
+    The rules and options must be kept in sync with latexmkrc.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+import os
+import re
+from collections import namedtuple
+
+__all__ = ['Rule', 'RULES', 'FORMATTER', 'OPTIONS', 'FILTERS',
+           'RTF_FORMATTER', 'RTF_OPTIONS', 'source_rule', 'outputs',
+           'commands']
+
+# $PYG_FORMATTER, $PYG_LEX_AND_FORMAT_OPTIONS and $PYG_FILTERS.
+FORMATTER = 'cilkbook'
+OPTIONS = ['texcomments', 'reindent', 'verbenvironment=CodeFigVerbatim',
+           'lineindex']
+FILTERS = []
+
+# $PYG_RTF_FORMATTER and $PYG_RTF_LEX_AND_FORMAT_OPTIONS, used when
+# $PRODUCE_RTF is set.
+RTF_FORMATTER = 'chrtf'
+RTF_OPTIONS = ['reindent', 'style=cilkbookstyle']
+
+# $PYG_FORMAT_AUTO_HIDDEN and $PYG_LEX_SKIP_HIDDEN.  skiphidden is
+# off by default, as it misses the typedefs in hidden regions.
+AUTO_HIDDEN = ['hidebydefault=auto']
+SKIP_HIDDEN = []
+
+# Rule for a source extension.  <options> are added to OPTIONS.  If
+# <markers> is set, the code is hidden by default when the source
+# contains a ##<< or ##>> marker, as found by a plain text search.
+# <rtfext> and <regionsext> are the extensions of the RTF output and of
+# the region index, or None if latexmkrc produces none.
+Rule = namedtuple('Rule', 'lexer outext options markers rtfext regionsext')
+
+RULES = {
+    'c': Rule('cilk', 'c-pyg', AUTO_HIDDEN + SKIP_HIDDEN, False,
+              'c-rtf', 'c-regions'),
+    'cpp': Rule('cilk', 'cpp-pyg', AUTO_HIDDEN + SKIP_HIDDEN, False,
+                'cpp-rtf', 'cpp-regions'),
+    'java': Rule('javacb', 'java-pyg', [], False, None, None),
+    'py': Rule('pythoncb', 'py-pyg', [], False, None, None),
+    's': Rule('gascb', 's-pyg', AUTO_HIDDEN, False, None, None),
+    'll': Rule('llvm', 'll-pyg', [], True, None, None),
+    'sh-session': Rule('console', 'sh-session-pyg', [], True, None, None),
+    'c-objdump': Rule('cilk-objdump', 'c-objdump-pyg', AUTO_HIDDEN, False,
+                      None, None),
+    'cpp-objdump': Rule('cilk-objdump', 'cpp-objdump-pyg', [], False,
+                        None, None),
+    'cilk-objdump': Rule('cilk-objdump', 'cilk-objdump-pyg', [], False,
+                         None, None),
+    'Makefile': Rule('makefile', 'Makefile-pyg', [], False, None, None),
+}
+
+_markers_re = re.compile(br'##<<|##>>')
+
+
+def source_rule(path):
+    """Return the (base, rule) pair for the source file <path>, where
+    base is <path> without its extension, or (None, None) if no rule
+    applies to <path>."""
+    base, ext = os.path.splitext(path)
+    rule = RULES.get(ext[1:])
+    if rule is None or not base or os.path.basename(path).startswith('.'):
+        return None, None
+    return base, rule
+
+
+def _has_markers(path):
+    try:
+        with open(path, 'rb') as f:
+            return _markers_re.search(f.read()) is not None
+    except (IOError, OSError):
+        return False
+
+
+def outputs(path, rtf=False, regions=True):
+    """Return the list of the outputs of the source <path>.  The RTF
+    output is included if <rtf> is set, and the region index if
+    <regions> is set."""
+    base, rule = source_rule(path)
+    if rule is None:
+        return []
+    result = [base + '.' + rule.outext]
+    if rtf and rule.rtfext:
+        result.append(base + '.' + rule.rtfext)
+    if regions and rule.regionsext:
+        result.append(base + '.' + rule.regionsext)
+    return result
+
+
+def _opts(flag, options):
+    args = []
+    for option in options:
+        args += [flag, option]
+    return args
+
+
+def commands(path, rtf=False, regions=False, options=None, filters=None,
+             pyg=True):
+    """Return the list of `cilkhilite.cmdline` argument lists that
+    highlight the source <path> as latexmkrc does, with the RTF output
+    if <rtf> is set and the named regions if <regions> is set.  If <pyg>
+    is not set, only the named regions are highlighted.  <options> and
+    <filters> replace OPTIONS and FILTERS."""
+    base, rule = source_rule(path)
+    if rule is None:
+        return []
+    if options is None:
+        options = OPTIONS
+    if filters is None:
+        filters = FILTERS
+    extra = list(rule.options)
+    if rule.markers and _has_markers(path):
+        extra.append('hidebydefault')
+    filter_args = _opts('-F', filters)
+    result = []
+    if pyg and rtf and rule.rtfext:
+        result.append(['-l', rule.lexer] + filter_args + _opts('-P', extra) +
+                      ['-f', FORMATTER] + _opts('-O', options) +
+                      ['-o', base + '.' + rule.outext] +
+                      ['-f', RTF_FORMATTER] + _opts('-O', RTF_OPTIONS) +
+                      ['-o', base + '.' + rule.rtfext, path])
+    elif pyg:
+        result.append(['-l', rule.lexer, '-f', FORMATTER] + filter_args +
+                      _opts('-P', options + extra) +
+                      ['-o', base + '.' + rule.outext, path])
+    if regions and rule.regionsext:
+        result.append(['-l', rule.lexer] + filter_args +
+                      ['-f', FORMATTER] + _opts('-O', options) +
+                      ['-o', path + '-{region}-pyg',
+                       '--region-index', base + '.' + rule.regionsext, path])
+    return result
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.stats
+    ~~~~~~~~~~~~~~~~
+
+    Statistics of a highlighting run, reported as JSON by the ``--stats``
+    option of ``pyginline`` and ``pyginpar``.
+
+    A `Stats` object counts the snippets highlighted by each lexer with
+    their sizes and their lexing and formatting times, keeps the slowest
+    snippets by name, and times the other phases of the run, such as
+    creating the lexers and formatters (``setup``) or writing the
+    output.  `highlight` is `pygments.highlight` with the
+    lexing and formatting timed separately, and traced as spans while a
+    `cilkhilite.trace` tracer is active.  The report looks like::
+
+        {"snippets": 120, "bytes_in": 4812, "bytes_out": 31250,
+         "seconds": {"total": 0.41, "setup": 0.2, "lex": 0.12,
+                     "format": 0.05, "write": 0.002},
+         "lexers": {"cilk": {"snippets": 118, "bytes_in": ...}, ...},
+         "slowest": [{"name": "@codehilite@code@...", "lexer": "cilk",
+                      "seconds": 0.004, "bytes_in": 63}, ...],
+         "cache": {"hits": 100, "misses": 20, "hit_ratio": 0.83},
+         "peak_rss_kib": 24576}
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+import heapq
+import json
+import sys
+import time
+from contextlib import nullcontext
+from io import BytesIO, StringIO
+from itertools import count
+
+from pygments import highlight as pygments_highlight
+
+from cilkhilite import trace
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = ['Stats', 'highlight', 'timer', 'peak_rss_kib']
+
+
+def peak_rss_kib():
+    """Return the peak resident set size of the process in KiB, or None
+    where it is not available."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # ru_maxrss is in bytes on macOS
+        rss //= 1024
+    return rss
+
+
+class Stats(object):
+    """Statistics of a highlighting run, keeping the <slowest> slowest
+    snippets."""
+
+    def __init__(self, slowest=10):
+        self.start = time.perf_counter()
+        self.lexers = {}
+        self.phases = {'lex': 0.0, 'format': 0.0}
+        self.slowest = slowest
+        self._slowest = []
+        self._order = count()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.counters = {}
+
+    def snippet(self, name, lexer, bytes_in, bytes_out, lex=0.0, fmt=0.0):
+        """Record the snippet <name>, highlighted by <lexer> from
+        <bytes_in> to <bytes_out> bytes in <lex> seconds of lexing and
+        <fmt> seconds of formatting.  Snippets that were neither lexed
+        nor formatted, e.g. cache hits, are not among the slowest."""
+        entry = self.lexers.get(lexer)
+        if entry is None:
+            entry = self.lexers[lexer] = {
+                'snippets': 0, 'bytes_in': 0, 'bytes_out': 0,
+                'lex_seconds': 0.0, 'format_seconds': 0.0}
+        entry['snippets'] += 1
+        entry['bytes_in'] += bytes_in
+        entry['bytes_out'] += bytes_out
+        entry['lex_seconds'] += lex
+        entry['format_seconds'] += fmt
+        self.phases['lex'] += lex
+        self.phases['format'] += fmt
+        if self.slowest > 0 and (lex or fmt):
+            item = (lex + fmt, next(self._order), name, lexer, bytes_in)
+            if len(self._slowest) < self.slowest:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+
+    def cache(self, hit):
+        """Record a cache hit if <hit>, and a miss otherwise."""
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+    def count(self, name, n=1):
+        """Add <n> to the counter <name>, e.g. of skipped snippets."""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def timer(self, phase):
+        """Return a context manager adding the time spent in its block
+        to <phase>."""
+        return _PhaseTimer(self, phase)
+
+    def report(self, **info):
+        """Return the statistics as a dict, together with <info>."""
+        result = dict(info)
+        result['snippets'] = sum(e['snippets'] for e in self.lexers.values())
+        result['bytes_in'] = sum(e['bytes_in'] for e in self.lexers.values())
+        result['bytes_out'] = sum(e['bytes_out'] for e in self.lexers.values())
+        seconds = dict(self.phases)
+        seconds['total'] = time.perf_counter() - self.start
+        result['seconds'] = seconds
+        result['lexers'] = self.lexers
+        result['slowest'] = [
+            {'name': name, 'lexer': lexer, 'seconds': elapsed,
+             'bytes_in': bytes_in}
+            for elapsed, _, name, lexer, bytes_in
+            in sorted(self._slowest, reverse=True)]
+        lookups = self.cache_hits + self.cache_misses
+        if lookups:
+            result['cache'] = {'hits': self.cache_hits,
+                               'misses': self.cache_misses,
+                               'hit_ratio': self.cache_hits / lookups}
+        result.update(self.counters)
+        result['peak_rss_kib'] = peak_rss_kib()
+        return result
+
+    def write(self, path, **info):
+        """Write the report, with <info>, as JSON to <path>."""
+        with open(path, 'w') as f:
+            json.dump(self.report(**info), f, indent=1, sort_keys=True)
+            f.write('\n')
+
+
+class _PhaseTimer(object):
+    def __init__(self, stats, phase):
+        self.stats = stats
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.add_time(self.phase, time.perf_counter() - self.start)
+
+
+def timer(stats, phase):
+    """Return `Stats.timer` of <stats> for <phase>, or a context manager
+    doing nothing if <stats> is None."""
+    if stats is None:
+        return nullcontext()
+    return stats.timer(phase)
+
+
+def highlight(code, lexer, formatter, stats=None, name=None, lexer_name=None):
+    """Return <code> highlighted with <lexer> and <formatter>, like
+    `pygments.highlight`.  If <stats> is given, the snippet is recorded
+    there as <name>, with the lexing and formatting timed separately;
+    the tokens are then lexed into a list before being formatted.  The
+    same goes while a tracer is active, which records the lexing and the
+    formatting as spans."""
+    if stats is None and trace.active() is None:
+        return pygments_highlight(code, lexer, formatter)
+    start = time.perf_counter()
+    with trace.span('lex', 'phase', snippet=name):
+        tokens = list(lexer.get_tokens(code))
+    lexed = time.perf_counter()
+    outfile = BytesIO() if getattr(formatter, 'encoding', None) else StringIO()
+    with trace.span('format', 'phase', snippet=name):
+        formatter.format(tokens, outfile)
+    output = outfile.getvalue()
+    formatted = time.perf_counter()
+    if stats is None:
+        return output
+    stats.snippet(name, lexer_name or lexer.aliases[0],
+                  len(code.encode('utf-8')),
+                  len(output if isinstance(output, bytes)
+                      else output.encode('utf-8')),
+                  lexed - start, formatted - lexed)
+    return output
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.tokencache
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Compact binary serialization of lexed token streams.
+
+    A token cache lets the same source be formatted again, e.g. with
+    different formatter options or with another formatter, without
+    running the lexer.  The file layout is:
+
+    * the magic bytes ``CHTK`` and a format version byte;
+    * a key string identifying the lexer, its options and filters, and
+      the source (see `cache_key`);
+    * a table of the distinct token types, interned by index;
+    * the text of the whole token stream, stored once;
+    * one ``(type index, length)`` pair per token.  Token values are
+      recovered as consecutive slices of the text.
+
+    Integers are stored as unsigned LEB128 varints and strings as a
+    varint byte length followed by UTF-8 data.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+import hashlib
+import os
+import tempfile
+
+from pygments.token import string_to_tokentype
+
+from cilkhilite.output import FILE_MODE
+
+__all__ = ['TokenCacheError', 'cache_key', 'dump_tokens', 'load_tokens',
+           'write_token_cache', 'read_token_cache', 'cached_tokens']
+
+MAGIC = b'CHTK'
+VERSION = 1
+
+
+class TokenCacheError(ValueError):
+    pass
+
+
+def _put_varint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _put_string(buf, s):
+    data = s.encode('utf-8')
+    _put_varint(buf, len(data))
+    buf.extend(data)
+
+
+def _get_varint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _get_string(data, pos):
+    length, pos = _get_varint(data, pos)
+    end = pos + length
+    if end > len(data):
+        raise TokenCacheError('truncated token cache')
+    return data[pos:end].decode('utf-8'), end
+
+
+def cache_key(lexer, source):
+    """Return a key that identifies the token stream produced by <lexer>
+    (including its options and filters) from <source>."""
+    h = hashlib.sha1()
+    h.update(source if isinstance(source, bytes) else source.encode('utf-8'))
+    parts = [lexer.__class__.__module__ + '.' + lexer.__class__.__name__,
+             repr(sorted(lexer.options.items()))]
+    for f in lexer.filters:
+        parts.append(f.__class__.__name__ + repr(sorted(f.options.items())))
+    parts.append(h.hexdigest())
+    return '\n'.join(parts)
+
+
+def dump_tokens(tokens, key=''):
+    """Serialize the (tokentype, value) pairs in <tokens> and return the
+    resulting bytes."""
+    types = {}
+    typenames = []
+    pairs = bytearray()
+    values = []
+    count = 0
+    for ttype, value in tokens:
+        index = types.get(ttype)
+        if index is None:
+            index = types[ttype] = len(typenames)
+            typenames.append('.'.join(ttype))
+        _put_varint(pairs, index)
+        _put_varint(pairs, len(value))
+        values.append(value)
+        count += 1
+
+    buf = bytearray(MAGIC)
+    buf.append(VERSION)
+    _put_string(buf, key)
+    _put_varint(buf, len(typenames))
+    for name in typenames:
+        _put_string(buf, name)
+    _put_string(buf, u''.join(values))
+    _put_varint(buf, count)
+    buf.extend(pairs)
+    return bytes(buf)
+
+
+def load_tokens(data):
+    """Deserialize bytes produced by `dump_tokens`.
+
+    Returns a (key, tokens) pair, where tokens is a list of (tokentype,
+    value) pairs."""
+    data = bytearray(data)
+    if data[:4] != bytearray(MAGIC):
+        raise TokenCacheError('not a token cache')
+    if len(data) < 5:
+        raise TokenCacheError('truncated token cache')
+    if data[4] != VERSION:
+        raise TokenCacheError('unsupported token cache version %d' % data[4])
+    try:
+        key, pos = _get_string(data, 5)
+        ntypes, pos = _get_varint(data, pos)
+        typelist = []
+        for _ in range(ntypes):
+            name, pos = _get_string(data, pos)
+            typelist.append(string_to_tokentype(name))
+        text, pos = _get_string(data, pos)
+        count, pos = _get_varint(data, pos)
+        tokens = []
+        offset = 0
+        for _ in range(count):
+            index, pos = _get_varint(data, pos)
+            length, pos = _get_varint(data, pos)
+            tokens.append((typelist[index], text[offset:offset + length]))
+            offset += length
+    except IndexError:
+        raise TokenCacheError('truncated token cache')
+    except UnicodeDecodeError:
+        raise TokenCacheError('corrupt token cache')
+    if offset != len(text) or pos != len(data):
+        raise TokenCacheError('corrupt token cache')
+    return key, tokens
+
+
+def write_token_cache(path, tokens, key=''):
+    """Write the token cache of <tokens> and <key> to <path>, through a
+    temporary file that replaces <path> once complete, so that an
+    interrupted run does not leave a partial cache."""
+    fd, tmppath = tempfile.mkstemp(prefix=os.path.basename(path) + '.',
+                                   suffix='.tmp',
+                                   dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            os.chmod(tmppath, FILE_MODE)
+            f.write(dump_tokens(tokens, key))
+        os.replace(tmppath, path)
+    except BaseException:
+        os.remove(tmppath)
+        raise
+
+
+def read_token_cache(path):
+    with open(path, 'rb') as f:
+        return load_tokens(f.read())
+
+
+def cached_tokens(lexer, source, path):
+    """Return the token stream of <source> lexed with <lexer> as a list.
+
+    If the token cache at <path> was written for the same lexer, lexer
+    options, filters and source, its tokens are returned and the lexer
+    is not run.  Otherwise <source> is lexed and the cache is
+    rewritten."""
+    key = cache_key(lexer, source)
+    try:
+        cached_key, tokens = read_token_cache(path)
+        if cached_key == key:
+            return tokens
+    except (IOError, OSError, TokenCacheError):
+        pass
+    tokens = list(lexer.get_tokens(source))
+    write_token_cache(path, tokens, key)
+    return tokens
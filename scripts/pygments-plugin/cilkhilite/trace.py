@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.trace
+    ~~~~~~~~~~~~~~~~
+
+    Timeline of a highlighting run, written in the Trace Event Format
+    that chrome://tracing and Perfetto open.
+
+    Tracing is opt-in.  `start` creates the process-wide `Tracer`, which
+    writes its events to a JSON file when the process exits; ``{pid}``
+    in the file name is replaced by the process ID.  `span` returns a
+    context manager recording a begin (``B``) event when its block
+    starts and an end (``E``) event when it ends, with the process and
+    thread IDs, and does nothing while no tracer is active.
+    ``pyginline`` and ``pyginpar`` start a tracer with ``--trace FILE``,
+    and record the parsing, lexing, formatting and writing of every
+    snippet or block, nested in a span named after the snippet.
+
+    If the environment variable ``CILKHILITE_TRACE`` is set, the tracer
+    is started when this module is imported, which also traces the
+    pygmentize runs of a build.  The ``get_tokens`` method of the
+    cilkhilite lexers and the ``format_unencoded`` method of the
+    cilkhilite formatters are traced when a tracer is active as their
+    modules are imported, which Pygments does on their first use.  As
+    Pygments lexes lazily, a lexer span then runs from the first token
+    to the last, nested in the span of the formatter that consumes the
+    tokens.
+
+    The traces of several processes, e.g. of the pygmentize runs of a
+    build, can be merged into one timeline::
+
+        python -m cilkhilite.trace -o build.json trace-*.json
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+__all__ = ['ENV_VAR', 'Tracer', 'start', 'active', 'span', 'traced',
+           'traced_lexer', 'merge', 'main']
+
+ENV_VAR = 'CILKHILITE_TRACE'
+
+_get_thread_id = getattr(threading, 'get_native_id', threading.get_ident)
+
+_tracer = None
+
+
+class Tracer(object):
+    """Records trace events, and writes them to <path>."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pid = os.getpid()
+        self.events = []
+        self.lock = threading.Lock()
+        self._threads = set()
+        # Timestamps are in microseconds since the epoch, so that the
+        # traces of several processes line up, but measured with the
+        # monotonic performance counter.
+        self._origin = time.time() * 1e6 - time.perf_counter() * 1e6
+
+    def event(self, ph, name, cat, args=None):
+        """Record an event of phase <ph> ('B' or 'E') named <name> in the
+        category <cat>, with the dict <args>."""
+        ts = self._origin + time.perf_counter() * 1e6
+        tid = _get_thread_id()
+        event = {'name': name, 'cat': cat, 'ph': ph, 'ts': ts,
+                 'pid': self.pid, 'tid': tid}
+        if args:
+            event['args'] = args
+        with self.lock:
+            if tid not in self._threads:
+                self._threads.add(tid)
+                self.events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': self.pid,
+                    'tid': tid,
+                    'args': {'name': threading.current_thread().name}})
+            self.events.append(event)
+
+    def span(self, name, cat, args=None):
+        return _Span(self, name, cat, args)
+
+    def trace(self):
+        """Return the trace as a dict in the Trace Event Format."""
+        with self.lock:
+            events = list(self.events)
+        events.insert(0, {
+            'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+            'args': {'name': os.path.basename(sys.argv[0] or 'python')}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, path=None):
+        """Write the trace to <path> (default: the path given to the
+        tracer), with ``{pid}`` replaced by the process ID."""
+        path = path or self.path
+        if path:
+            with open(path.replace('{pid}', str(self.pid)), 'w') as f:
+                json.dump(self.trace(), f)
+
+
+class _Span(object):
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.tracer.event('B', self.name, self.cat, self.args)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.event('E', self.name, self.cat)
+
+
+def start(path):
+    """Start the process-wide tracer, writing to <path> at exit, and
+    return it.  If a tracer is active already, its output goes to <path>
+    instead."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(path)
+        atexit.register(_dump)
+    else:
+        _tracer.path = path
+    return _tracer
+
+
+def _dump():
+    if _tracer is not None:
+        _tracer.dump()
+
+
+def active():
+    """Return the process-wide tracer, or None if there is none."""
+    return _tracer
+
+
+def span(name, cat='cilkhilite', **args):
+    """Return a context manager recording its block as a span named
+    <name> in the category <cat>, with the arguments <args>, if a tracer
+    is active."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.span(name, cat, args)
+
+
+def traced(cat):
+    """Decorator recording each call of a method as a span in the
+    category <cat>, named after the class of the instance and the
+    method, if a tracer is active when the method is decorated.
+    Otherwise, return the method itself."""
+    def decorator(func):
+        if _tracer is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            name = type(self).__name__ + '.' + func.__name__
+            with _tracer.span(name, cat, None):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _traced_tokens(tokens, name, size):
+    with _tracer.span(name, 'lexer', {'chars': size}):
+        for token in tokens:
+            yield token
+
+
+def traced_lexer(cls):
+    """Class decorator tracing the token streams returned by the
+    ``get_tokens`` method of the lexer class <cls>, if a tracer is
+    active when the class is decorated."""
+    if _tracer is None:
+        return cls
+    get_tokens = cls.get_tokens
+
+    @functools.wraps(get_tokens)
+    def wrapper(self, text, *args, **kwargs):
+        return _traced_tokens(get_tokens(self, text, *args, **kwargs),
+                              type(self).__name__ + '.get_tokens', len(text))
+    cls.get_tokens = wrapper
+    return cls
+
+
+if os.environ.get(ENV_VAR):
+    start(os.environ[ENV_VAR])
+
+
+def merge(paths):
+    """Return the trace made of the events of the traces in <paths>."""
+    events = []
+    for path in paths:
+        with open(path, 'r') as f:
+            events.extend(json.load(f)['traceEvents'])
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def main(args=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='python -m cilkhilite.trace',
+        description='Merge the traces <trace> into one timeline.')
+    parser.add_argument('traces', metavar='<trace>', nargs='+')
+    parser.add_argument('-o', dest='output', metavar='OUTFILE', required=True,
+                        help='file for the merged trace')
+    args = parser.parse_args(args)
+
+    try:
+        trace = merge(args.traces)
+    except (IOError, OSError, ValueError, KeyError) as err:
+        print('python -m cilkhilite.trace: {0}'.format(err), file=sys.stderr)
+        return 1
+    with open(args.output, 'w') as f:
+        json.dump(trace, f)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+    cilkhilite.watch
+    ~~~~~~~~~~~~~~~~
+
+    Watch mode, which highlights the listings of a book as they change,
+    so that their outputs are current by the time latexmk runs::
+
+        python -m cilkhilite.watch [-v] [--rtf] [DIR ...]
+
+    The sources under each DIR (default: the current directory) are
+    highlighted with the lexers and options of latexmkrc (see
+    `cilkhilite.rules`), first those whose outputs are missing or older
+    than the source, then each source whenever it is written.  The named
+    regions of a source are highlighted again if its region index,
+    e.g. ``qsort.c-regions``, exists.
+
+    On Linux, changes are reported by inotify.  Elsewhere, or with
+    ``--poll``, the directories are scanned every ``--interval``
+    seconds.  As the outputs are written with `cilkhilite.output`, a
+    source saved without changes does not touch them.
+
+    latexmk highlights a source again whenever its contents differ from
+    those of its previous run, even if the watcher has highlighted it
+    since.  So that this run does nothing, the watcher writes a stamp
+    next to each output it produces, e.g. ``fib.c-pyg.stamp``, holding
+    the SHA-1 digest of the source.  The latexmkrc rules skip an output
+    whose stamp matches the source, and update the stamp when they
+    highlight the source themselves.
+
+    :copyright: Copyright 2014 by Tao B. Schardl
+    :license: BSD
+"""
+
+from __future__ import print_function
+
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from cilkhilite import cmdline, rules
+from cilkhilite.output import file_digest
+
+__all__ = ['find_sources', 'is_stale', 'stamp_path', 'write_stamps',
+           'highlight_source', 'Poller', 'Inotify', 'main']
+
+PROG = 'cilkhilite.watch'
+
+# Delay in seconds for collecting the events of one save, as editors
+# often write a file in several steps.
+SETTLE = 0.1
+
+
+def find_sources(dirs):
+    """Yield the paths of the sources under the directories <dirs> that
+    have a rule, skipping hidden directories."""
+    for top in dirs:
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if rules.source_rule(path)[1] is not None:
+                    yield path
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def is_stale(path, rtf=False):
+    """Return True if an output of the source <path> is missing or older
+    than the source.  The region index only counts if it exists."""
+    mtime = _mtime(path)
+    base, rule = rules.source_rule(path)
+    for output in rules.outputs(path, rtf, regions=False):
+        out_mtime = _mtime(output)
+        if out_mtime is None or out_mtime < mtime:
+            return True
+    if rule.regionsext:
+        index_mtime = _mtime(base + '.' + rule.regionsext)
+        if index_mtime is not None and index_mtime < mtime:
+            return True
+    return False
+
+
+def stamp_path(output):
+    """Return the path of the stamp of <output>."""
+    return output + '.stamp'
+
+
+def write_stamps(outputs, digest):
+    """Record in the stamps of <outputs> that they were produced from a
+    source with the SHA-1 hex digest <digest>."""
+    for output in outputs:
+        with open(stamp_path(output), 'w') as f:
+            f.write(digest + '\n')
+
+
+def highlight_source(path, rtf=False, verbose=False):
+    """Highlight the source <path> as latexmkrc does, and stamp its
+    outputs.  Return True if every output was produced."""
+    base, rule = rules.source_rule(path)
+    regions = rule.regionsext is not None and \
+        os.path.exists(base + '.' + rule.regionsext)
+    try:
+        # Digest the source before highlighting it, so that a change
+        # made meanwhile leaves the stamps stale.
+        digest = file_digest(path)
+    except (IOError, OSError) as err:
+        print('{0}: cannot read "{1}": {2}'.format(PROG, path, err),
+              file=sys.stderr)
+        return False
+    ok = True
+    for args in rules.commands(path, rtf, regions):
+        try:
+            status = cmdline.main(args)
+        except Exception as err:
+            print('{0}: error highlighting "{1}": {2}'.format(PROG, path, err),
+                  file=sys.stderr)
+            status = 1
+        ok = ok and status == 0
+    if ok:
+        write_stamps(rules.outputs(path, rtf, regions), digest)
+    if verbose and ok:
+        print('{0}: highlighted {1}'.format(PROG, path))
+    return ok
+
+
+class Poller(object):
+    """Finds the sources under <dirs> that changed since the previous
+    call to `changes`, by comparing their modification times."""
+
+    def __init__(self, dirs):
+        self.dirs = dirs
+        self.mtimes = self._scan()
+
+    def _scan(self):
+        mtimes = {}
+        for path in find_sources(self.dirs):
+            mtime = _mtime(path)
+            if mtime is not None:
+                mtimes[path] = mtime
+        return mtimes
+
+    def changes(self, timeout):
+        time.sleep(timeout)
+        mtimes = self._scan()
+        changed = set(path for path, mtime in mtimes.items()
+                      if self.mtimes.get(path) != mtime)
+        self.mtimes = mtimes
+        return changed
+
+    def close(self):
+        pass
+
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+_event = struct.Struct('iIII')
+
+
+class Inotify(object):
+    """Finds the sources under <dirs> that are written or moved there,
+    using inotify.  Raises OSError where inotify is not available."""
+
+    def __init__(self, dirs):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                    ctypes.c_uint32]
+        self.fd = init(IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.dirs = {}
+        for top in dirs:
+            self._watch_tree(top)
+
+    def _watch_tree(self, top):
+        for dirpath, dirnames, _ in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            wd = self._add_watch(self.fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                print('{0}: cannot watch "{1}": {2}'.format(
+                    PROG, dirpath, os.strerror(err)), file=sys.stderr)
+            else:
+                self.dirs[wd] = dirpath
+
+    def _read(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 1 << 16)
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = _event.unpack_from(data, pos)
+            pos += _event.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            events.append((wd, mask, name))
+        return events
+
+    def changes(self, timeout):
+        changed = set()
+        events = self._read(timeout)
+        while events:
+            for wd, mask, name in events:
+                if mask & IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                dirpath = self.dirs.get(wd)
+                if dirpath is None or not name:
+                    continue
+                path = os.path.join(dirpath, name)
+                if mask & IN_ISDIR:
+                    if not name.startswith('.'):
+                        self._watch_tree(path)
+                        changed.update(find_sources([path]))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and \
+                        rules.source_rule(path)[1] is not None:
+                    changed.add(path)
+            events = self._read(SETTLE)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m ' + PROG,
+        description='Highlight the sources under <dir> as latexmkrc does, '
+        'whenever they change.')
+    parser.add_argument('dirs', metavar='<dir>', nargs='*', default=['.'])
+    parser.add_argument('--rtf', action='store_true',
+                        help='also produce the RTF outputs, as with '
+                        '$PRODUCE_RTF in latexmkrc')
+    parser.add_argument('--poll', action='store_true',
+                        help='scan the directories instead of using inotify')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        metavar='SECONDS',
+                        help='time between scans (default: 1)')
+    parser.add_argument('--once', action='store_true',
+                        help='highlight the stale sources and exit')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    return parser
+
+
+def main(args=None):
+    args = make_parser().parse_args(args)
+
+    watcher = None
+    if not args.once:
+        if not args.poll:
+            try:
+                watcher = Inotify(args.dirs)
+            except OSError as err:
+                if args.verbose:
+                    print('{0}: {1}; polling instead'.format(PROG, err))
+        if watcher is None:
+            watcher = Poller(args.dirs)
+
+    status = 0
+    for path in sorted(find_sources(args.dirs)):
+        if is_stale(path, args.rtf) and \
+                not highlight_source(path, args.rtf, args.verbose):
+            status = 1
+    if watcher is None:
+        return status
+
+    if args.verbose:
+        print('{0}: watching {1}'.format(PROG, ' '.join(args.dirs)))
+    try:
+        while True:
+            for path in sorted(watcher.changes(args.interval)):
+                if os.path.exists(path):
+                    highlight_source(path, args.rtf, args.verbose)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,4 @@
-PYTHON=python
+PYTHON=python3
 PYGPLUGIN_DIR ?= .
 PYGPLUGIN_TS=$(PYGPLUGIN_DIR)/.pyg-plugin.ts
 PYGPLUGIN_NAME=cilkhilite
@@ -15,13 +15,13 @@ clean_pygplugin :
 $(PYGPLUGIN_TS) : $(PYGPLUGIN_DIR)/setup.py $(PYGPLUGIN_FILES)
 	@command -v pygmentize >/dev/null 2>&1 && \
 	pygmentize -V | \
-	perl -n -e'/^Pygments\sversion\s(\d+\.\d+)/ && $$1 >= 1.6 or die "Please install Pygments version >= 1.6";' && \
+	perl -n -e'/^Pygments\sversion\s(\d+)\.(\d+)/ && ($$1 > 2 || ($$1 == 2 && $$2 >= 5)) or die "Please install Pygments version >= 2.5";' && \
 	cd $(PYGPLUGIN_DIR) && $(PYTHON) setup.py build && $(PYTHON) setup.py install --user && cd - && \
 	touch $@
 
 remake_pygplugin :
 	@command -v pygmentize >/dev/null 2>&1 && \
 	pygmentize -V | \
-	perl -n -e'/^Pygments\sversion\s(\d+\.\d+)/ && $$1 >= 1.6 or die "Please install Pygments version >= 1.6";' && \
+	perl -n -e'/^Pygments\sversion\s(\d+)\.(\d+)/ && ($$1 > 2 || ($$1 == 2 && $$2 >= 5)) or die "Please install Pygments version >= 2.5";' && \
 	cd $(PYGPLUGIN_DIR) && $(PYTHON) setup.py build && $(PYTHON) setup.py install --user && cd - && \
 	touch $(PYGPLUGIN_TS)
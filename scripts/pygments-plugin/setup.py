@@ -5,6 +5,7 @@ from setuptools import setup
 entry_points = """ 
 [pygments.lexers] 
 cilklexer = cilkhilite.cilklexer:CilkLexer
+cilkfastlexer = cilkhilite.cilklexer:CilkFastLexer
 cilkobjdumplexer = cilkhilite.cilklexer:CilkObjdumpLexer
 pythonCBlexer = cilkhilite.cilklexer:PythonCBLexer
 javaCBlexer = cilkhilite.cilklexer:JavaCBLexer
@@ -24,5 +25,7 @@ setup(
     description  = __doc__, 
     author       = "Tao B. Schardl", 
     packages     = ['cilkhilite'], 
+    python_requires  = '>=3.8',
+    install_requires = ['Pygments>=2.5'],
     entry_points = entry_points 
 ) 